@@ -8,8 +8,9 @@ Pasos:
 2. **_matchlog_url**: construye la URL del match‑log de la temporada indicada
    (`YYYY` = temporada que termina ese año; 2025 → 2024‑2025).
 3. Descarga y cachea el HTML en `data/fb_html_cache` para no golpear el sitio.
-4. Lee la tabla con `pandas.read_html`, filtra filas reales y devuelve los
-   últimos *n* partidos con columnas traducidas.
+4. Recorta la tabla (también si está comentada) y la lee en streaming con
+   `lxml.etree.iterparse`, filtra filas reales y devuelve los últimos *n*
+   partidos con columnas traducidas.
 
 Uso:
 ```python
@@ -21,63 +22,83 @@ Si `season` es `None`, se usa el año actual.
 """
 from __future__ import annotations
 
-import re, unicodedata, time
+import hashlib, io, json, logging, os, re, unicodedata, time
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional, List
 
 import pandas as pd
-import requests
-from bs4 import BeautifulSoup
+from lxml import etree
+from selectolax.lexbor import LexborHTMLParser
+
+from utils.http import make_session
 
 CACHE_DIR = Path("data/fb_html_cache")
 CACHE_DIR.mkdir(parents=True, exist_ok=True)
 HEADERS = {"User-Agent": "Mozilla/5.0 (ScoutingApp)"}
 BASE = "https://fbref.com"
+log = logging.getLogger(__name__)
+_SESSION = make_session(HEADERS)
+# Vida de las cachés en memoria; igual que el TTL del HTML en disco
+_TTL = 6 * 60 * 60
+
+
+def _ttl_bucket() -> int:
+    """Franja temporal de `_TTL` segundos: al cambiar, caducan las entradas memoizadas."""
+    return int(time.time() // _TTL)
 
 # ────────────────────────────────────────────────────────────────────────────────
 # Helpers de depuración
 # ────────────────────────────────────────────────────────────────────────────────
 
 def _dbg(tag: str, val: object) -> None:
-    print(f"[FBREF DEBUG] {tag}: {val}", flush=True)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("[FBREF DEBUG] %s: %s", tag, val)
+
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
 
 
 def _slugify(text: str) -> str:
-    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
-    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+    if not text.isascii():  # los nombres ASCII no necesitan normalización
+        text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+    return _NON_ALNUM.sub("-", text.lower()).strip("-")
 
 # ────────────────────────────────────────────────────────────────────────────────
 # Player search
 # ────────────────────────────────────────────────────────────────────────────────
 
-def _search_player(name: str) -> Optional[tuple[str, str]]:
+@lru_cache(maxsize=1024)
+def _search_player(name: str, ttl_bucket: int) -> Optional[tuple[str, str]]:
     """Devuelve `(player_id, slug)` buscando en la página de resultados.
 
     • Intenta localizar `div.search-item-url` (nuevo layout FBref).
     • Fallback a la etiqueta `<a>` como antes.
+
+    Los errores de red se propagan para que `lru_cache` no memoice el fallo;
+    `ttl_bucket` (ver `_ttl_bucket`) hace caducar los aciertos.
     """
     url = f"{BASE}/en/search/search.fcgi?search={_slugify(name)}"
     _dbg("search", url)
-    try:
-        html = requests.get(url, headers=HEADERS, timeout=15).text
-    except requests.RequestException as exc:
-        _dbg("req error", exc)
-        return None
+    r = _SESSION.get(url, timeout=15)
+    r.raise_for_status()
+    html = r.content
 
-    soup = BeautifulSoup(html, "lxml")
+    tree = LexborHTMLParser(html)
 
     # 1) Nuevo formato – la URL completa está en un div.search-item-url
-    url_div = soup.select_one("div.search-item-url")
-    if url_div and url_div.text.startswith("/en/players/"):
-        href = url_div.text.strip()
+    url_div = tree.css_first("div.search-item-url")
+    url_text = url_div.text() if url_div else ""
+    if url_text.startswith("/en/players/"):
+        href = url_text.strip()
     else:
         # 2) Antiguo formato – primer enlace <a href="/en/players/...">
-        a = soup.select_one("a[href^='/en/players/']")
-        if not a:
+        a = tree.css_first("a[href^='/en/players/']")
+        href = a.attributes.get("href") if a else None
+        if not href:
             _dbg("no result", name)
             return None
-        href = a["href"]
 
     parts = href.strip("/").split("/")
     if len(parts) < 4:
@@ -96,48 +117,144 @@ def _matchlog_url(pid: str, slug: str, season: int) -> str:
 
 
 def _get_html(url: str) -> str:
-    fn = CACHE_DIR / (url.split("/")[-2] + "_" + url.split("/")[-1] + ".html")
+    """Descarga con caché en disco; pasadas 6 h revalida con GET condicional."""
+    fn = CACHE_DIR / f"{hashlib.blake2b(url.encode(), digest_size=16).hexdigest()}.html"
+    meta_fn = fn.with_suffix(".meta.json")
     if fn.exists() and fn.stat().st_mtime > time.time() - 6 * 60 * 60:
         return fn.read_text("utf-8")
-    r = requests.get(url, headers=HEADERS, timeout=15)
+
+    headers = {}
+    if fn.exists() and meta_fn.exists():
+        try:
+            meta = json.loads(meta_fn.read_text("utf-8"))
+        except json.JSONDecodeError:
+            meta = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    r = _SESSION.get(url, headers=headers, timeout=15)
     _dbg("log status", r.status_code)
+    if r.status_code == 304:
+        os.utime(fn)  # sigue vigente: renueva el TTL
+        return fn.read_text("utf-8")
     r.raise_for_status()
     fn.write_text(r.text, "utf-8")
+    meta_fn.write_text(json.dumps({
+        "etag": r.headers.get("ETag"),
+        "last_modified": r.headers.get("Last-Modified"),
+    }), "utf-8")
     return r.text
 
+# La tabla se localiza por su id (igual en el HTML y dentro del bloque <!-- -->)
+_TABLE_RX = re.compile(r'<table\b[^>]*\bid="matchlogs_all"')
+_TABLE_TAG_RX = re.compile(r"<table\b|</table>")
+
+
+def _matchlog_fragment(html: str) -> Optional[str]:
+    """Recorta el HTML de la tabla `#matchlogs_all` (esté o no dentro de un <!-- -->)."""
+    m = _TABLE_RX.search(html)
+    if not m:
+        return None
+    # Cierre emparejado: una tabla anidada no corta el fragmento antes de tiempo
+    depth = 0
+    for tag in _TABLE_TAG_RX.finditer(html, m.start()):
+        depth += -1 if tag.group().startswith("</") else 1
+        if depth == 0:
+            return html[m.start():tag.end()]
+    return None
+
+
+def _cells(tr) -> List[str]:
+    """Textos de las celdas; un `colspan` repite el texto en cada columna que
+    abarca (como `pd.read_html`), p. ej. «Unused Substitute»."""
+    out: List[str] = []
+    for c in tr:
+        if c.tag not in ("th", "td"):
+            continue
+        text = "".join(c.itertext()).strip()
+        try:
+            span = max(1, int(c.get("colspan") or 1))
+        except ValueError:
+            span = 1
+        out.extend([text] * span)
+    return out
+
+
+def _matchlog_frame(html: str) -> Optional[pd.DataFrame]:
+    """Construye el DataFrame fila a fila con `iterparse` (sin `pd.read_html`).
+
+    Solo se parsea el fragmento de la tabla y cada <tr> se libera tras leerlo,
+    así que la memoria no depende del tamaño total de la página.
+    """
+    fragment = _matchlog_fragment(html)
+    if fragment is None:
+        return None
+
+    headers: List[str] = []
+    rows: List[List[str]] = []
+    buf = io.BytesIO(fragment.encode("utf-8"))
+    for _, tr in etree.iterparse(buf, events=("end",), tag="tr", html=True, encoding="utf-8"):
+        if sum(1 for _ in tr.iterancestors("table")) > 1:
+            continue  # fila de una tabla anidada: su texto ya va en la celda exterior
+        cells = _cells(tr)
+        parent = tr.getparent()
+        section = parent.tag if parent is not None else None
+        if section == "thead":
+            # La última fila del <thead> lleva los nombres reales (la primera agrupa)
+            headers = cells
+        elif cells and "thead" not in (tr.get("class") or ""):
+            rows.append(cells)
+        tr.clear()
+
+    if not headers or not rows:
+        return None
+    # Filas cortas (celdas finales omitidas) se rellenan en vez de descartarse
+    width = len(headers)
+    rows = [(r + [""] * (width - len(r)))[:width] for r in rows]
+    return pd.DataFrame(rows, columns=headers)
+
 # ────────────────────────────────────────────────────────────────────────────────
 # Public function
 # ────────────────────────────────────────────────────────────────────────────────
 
 def last_matches(name: str, season: int | None = None, n: int = 5) -> Optional[pd.DataFrame]:
     """Devuelve DataFrame con los *n* últimos partidos de la temporada indicada."""
-    pid_slug = _search_player(name)
+    try:
+        df = _last_matches(name, season or datetime.now().year, n, _ttl_bucket())
+    except Exception as exc:  # red/servidor: no se cachea, se reintenta la próxima vez
+        _dbg("req error", exc)
+        return None
+    # Copia: el resultado cacheado no debe mutarse desde fuera
+    return None if df is None else df.copy()
+
+
+@lru_cache(maxsize=256)
+def _last_matches(name: str, season: int, n: int, ttl_bucket: int) -> Optional[pd.DataFrame]:
+    pid_slug = _search_player(name, ttl_bucket)
     if not pid_slug:
         return None
     pid, slug = pid_slug
 
-    season = season or datetime.now().year
     url = _matchlog_url(pid, slug, season)
     _dbg("matchlog", url)
 
-    try:
-        html = _get_html(url)
-    except Exception as exc:
-        _dbg("html error", exc)
-        return None
+    html = _get_html(url)  # los fallos se propagan a `last_matches` sin cachearse
 
-    # FBref a veces esconde la tabla en un "comment"; BeautifulSoup quita los <!-- -->
-    tables = pd.read_html(html, match="Match Logs", flavor="bs4")
-    if not tables:
+    df = _matchlog_frame(html)
+    if df is None:
         _dbg("no tables", slug)
         return None
-    df = tables[0]
 
-    # Líneas de encabezado repetidas → eliminar rows donde 'Rk' == 'Rk'
-    df = df[df["Rk"].astype(str) != "Rk"]
+    # Líneas de encabezado repetidas → eliminar rows donde 'Rk' == 'Rk'.
+    # Solo hacen falta n filas: se filtra sobre una cola con margen.
+    df_last = df.tail(n * 3)
+    if "Rk" in df_last.columns:
+        df_last = df_last[df_last["Rk"].to_numpy() != "Rk"]
 
     # Toma las últimas n filas reales
-    df_last = df.tail(n)
+    df_last = df_last.tail(n)
 
     # Seleccionar columnas clave
     cols_map = {
@@ -153,7 +270,14 @@ def last_matches(name: str, season: int | None = None, n: int = 5) -> Optional[p
     }
     subset = [c for c in cols_map if c in df_last.columns]
     df_last = df_last[subset].rename(columns=cols_map)
-    df_last["Fecha"] = pd.to_datetime(df_last["Fecha"]).dt.strftime("%d-%m-%Y")
+    for col in ("Min", "Goles", "Asist", "xG", "xA"):
+        if col in df_last.columns:
+            df_last[col] = pd.to_numeric(df_last[col], errors="coerce")
+    if "Fecha" in df_last.columns:
+        # FBref ya da la fecha en ISO (YYYY-MM-DD): basta reordenar → DD-MM-YYYY
+        df_last["Fecha"] = df_last["Fecha"].str.replace(
+            r"^(\d{4})-(\d{2})-(\d{2})$", r"\3-\2-\1", regex=True
+        )
 
     _dbg("rows returned", len(df_last))
     return df_last.reset_index(drop=True) if not df_last.empty else None
@@ -1,6 +1,7 @@
 # adaptors/soccerdata_fbref.py  (versión corregida)
 from __future__ import annotations
 import pathlib
+from functools import lru_cache
 import pandas as pd
 import soccerdata as sd
 from rapidfuzz import process
@@ -8,38 +9,101 @@ from utils.text import normalize
 
 DATA_DIR = pathlib.Path("data/fb_cache")
 
+# Únicas columnas que usa `get_player_stats`; el resto del frame se descarta
+_STD_COLS = [
+    "player", "season", "team", "league", "age", "pos",
+    "Playing Time_MP", "Playing Time_Min",
+    "Performance_Gls", "Performance_Ast", "Expected_xG",
+]
+_INT_COLS = ["Playing Time_MP", "Playing Time_Min", "Performance_Gls", "Performance_Ast"]
+_CAT_COLS = ["team", "league", "pos"]
+
+
+def _key(value):
+    """Convierte listas de temporadas/ligas en tuplas para poder cachear."""
+    return tuple(value) if isinstance(value, list) else value
+
+
+def _unkey(value):
+    return list(value) if isinstance(value, tuple) else value
+
+
+@lru_cache(maxsize=8)
+def _client(seasons, leagues) -> sd.FBref:
+    return sd.FBref(seasons=_unkey(seasons), leagues=_unkey(leagues), data_dir=DATA_DIR)
+
+
+@lru_cache(maxsize=8)
+def _load_std(seasons, leagues) -> tuple[pd.DataFrame, list[str], dict[str, int]]:
+    """Stats «standard» ya aplanadas y con `name_norm`; se construyen una vez.
+
+    Devuelve también `name_norm` como lista para el fuzzy-match de rapidfuzz y
+    un índice `name_norm -> posición` de la temporada más reciente de cada nombre.
+    """
+    df = (
+        _client(seasons, leagues)
+        .read_player_season_stats(stat_type="standard")
+        .reset_index()
+    )
+    # Aplana MultiIndex en columnas
+    df.columns = [
+        "_".join([c for c in col if c]) if isinstance(col, tuple) else col
+        for col in df.columns
+    ]
+    # ▸ Proyecta a las columnas necesarias y reduce tipos (menos memoria)
+    df = df[[c for c in _STD_COLS if c in df.columns]].copy()
+    for c in _INT_COLS:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce", downcast="integer")
+    if "Expected_xG" in df.columns:
+        df["Expected_xG"] = pd.to_numeric(df["Expected_xG"], errors="coerce")
+    for c in _CAT_COLS:
+        if c in df.columns:
+            df[c] = df[c].astype("category")
+
+    # ▸ Normaliza toda la columna UNA sola vez (columna auxiliar), vectorizado
+    #   con los mismos pasos que `utils.text.normalize`
+    df["name_norm"] = (
+        df["player"].astype(str)
+        .str.normalize("NFKD")
+        .str.encode("ascii", errors="ignore").str.decode("ascii")
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+        .str.lower()
+    )
+    names = df["name_norm"].tolist()
+    # Recorrido por temporada ascendente: la última asignación (más reciente) gana
+    order = df["season"].sort_values(kind="stable").index
+    name_idx = {names[i]: i for i in order}
+    return df, names, name_idx
+
+
+@lru_cache(maxsize=2048)
+def _row_cached(target: str, seasons, leagues) -> pd.Series | None:
+    """Fila del jugador por nombre ya normalizado; repetir consulta es O(1)."""
+    df, names, name_idx = _load_std(seasons, leagues)
+
+    # 1) Coincidencia exacta normalizada (O(1) vía índice)
+    idx = name_idx.get(target)
+    if idx is not None:
+        return df.iloc[idx]
+
+    # 2) Fuzzy-match sobre la columna normalizada
+    choice, score, idx = process.extractOne(
+        target, names, score_cutoff=80
+    ) or (None, None, None)
+    return None if choice is None else df.iloc[idx]
+
+
 class FBrefStats:
     def __init__(self, seasons="2024-2025",
                  leagues="Big 5 European Leagues Combined"):
-        self._fb = sd.FBref(seasons=seasons,
-                            leagues=leagues,
-                            data_dir=DATA_DIR)
+        self._seasons = _key(seasons)
+        self._leagues = _key(leagues)
+        self._fb = _client(self._seasons, self._leagues)
 
     def _player_row(self, name: str) -> pd.Series | None:
-        df = (
-            self._fb.read_player_season_stats(stat_type="standard")
-            .reset_index()
-        )
-        # Aplana MultiIndex en columnas
-        df.columns = [
-            "_".join([c for c in col if c]) if isinstance(col, tuple) else col
-            for col in df.columns
-        ]
-
-        # ▸ Normaliza toda la columna UNA sola vez (columna auxiliar)
-        df["name_norm"] = df["player"].apply(normalize)
-        target = normalize(name)
-
-        # 1) Coincidencia exacta normalizada
-        exact = df[df["name_norm"] == target]
-        if not exact.empty:
-            return exact.sort_values("season").iloc[-1]
-
-        # 2) Fuzzy-match sobre la columna normalizada
-        choice, score, idx = process.extractOne(
-            target, df["name_norm"], score_cutoff=80
-        ) or (None, None, None)
-        return None if choice is None else df.iloc[idx]
+        return _row_cached(normalize(name), self._seasons, self._leagues)
 
     def get_player_stats(self, name: str) -> dict | None:
         row = self._player_row(name)
@@ -58,6 +122,3 @@ class FBrefStats:
             "assists":  int(row.get("Performance_Ast", 0)),
             "xG":       float(row.get("Expected_xG", 0))
         }
-
-
-
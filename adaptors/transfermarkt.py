@@ -1,30 +1,47 @@
-"""transfermarkt.py – adaptor con DEBUG prints
+"""transfermarkt.py – adaptor con logs de depuración
 Versión robusta y formateada correctamente. Obtiene el valor de mercado en **M€**
 para un nombre de jugador o una URL directa de Transfermarkt.
 
 Estrategia resumida:
 1. Si el argumento es una URL (`http`), se scrapea esa página directamente.
-2. Si es un nombre, se normaliza y se busca en los dominios .com / .es / .de.
-3. De la lista de resultados se extraen TODAS las URLs de perfil y se prueban
-   hasta encontrar una con valor ≠ None.
+2. Si es un nombre, se normaliza y se busca en los dominios .com / .es / .de
+   (las tres búsquedas se lanzan en paralelo; se prefiere el dominio que más
+   aciertos acumula en `data/tm_domain_scores.json`).
+3. De la lista de resultados se extraen las URLs de perfil del mismo dominio,
+   se quedan las 3 cuyo texto más se parece al nombre y se prueban
+   concurrentemente hasta encontrar una con valor ≠ None.
 4. El valor se obtiene primero de un bloque JSON (`TM.initData`) y, si no
    existe o vale 0, de un texto visible «€ 25.00 m / k».
-5. Incluye `print()` de depuración con prefijo `[TM DEBUG]`.
+5. Incluye logs de depuración (`logging`, nivel DEBUG) con prefijo `[TM DEBUG]`.
 """
 from __future__ import annotations
 
 import json
+import logging
+import os
 import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
 from pathlib import Path
-from urllib.parse import quote_plus
+from urllib.parse import quote_plus, urlsplit, urlunsplit
 
-import bs4
 import requests
+from rapidfuzz import fuzz
+from selectolax.lexbor import LexborHTMLParser
 
+from utils.http import make_session
 from utils.text import normalize
 
+try:  # parser JSON en Rust; acepta bytes directamente
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # dependencia opcional
+    _json_loads = json.loads
+
+log = logging.getLogger(__name__)
+
 # ────────────────────────────────────────────────────────────────────────────────
 # Constantes
 # ────────────────────────────────────────────────────────────────────────────────
@@ -39,49 +56,105 @@ _HEADERS = {
     "Accept-Language": "en-US,en;q=0.8",  # evita redirecciones al .de/.es
 }
 
-_JSON_RX = re.compile(r"TM\.initData\s*=\s*(\{.*?\});", re.S)
-_VAL_RX = re.compile(r"€\s?([\d.,]+)\s?([mk])", re.I)
+# Sesión compartida: reutiliza conexiones TCP/TLS entre búsquedas y perfiles
+_SESSION = make_session(_HEADERS)
+
+# Concurrencia: hilos totales y peticiones simultáneas por host
+_MAX_WORKERS = 4
+_PER_HOST_LIMIT = 2
+_HOST_GATES: dict[str, threading.Semaphore] = {}
+_HOST_GATES_LOCK = threading.Lock()
+
+# Ritmo educado por host (token bucket); tras un 429 se va a la mitad un rato
+_RATE_PER_HOST = 2.0
+_BURST_PER_HOST = 4
+_BACKOFF_SECS = 60.0
+_HOST_BUCKETS: dict[str, "_TokenBucket"] = {}
+
+# Patrones sobre `bytes`: se busca en `r.content` sin decodificar la página entera.
+# `_WS` reproduce el `\s` de str (incluye NBSP y narrow NBSP en UTF-8).
+_WS = rb"(?:\s|\xc2\xa0|\xe2\x80\xaf)"
+_JSON_RX = re.compile(rb"TM\.initData\s*=\s*(\{.*?\});", re.S)
+_VAL_RX = re.compile(rb"\xe2\x82\xac" + _WS + rb"?([\d.,]+)" + _WS + rb"?([mk])", re.I)
+# Máximo de perfiles candidatos que se scrapean por búsqueda
+_MAX_CANDIDATES = 3
+
+# Anclas cerca de las que aparece el valor visible; se prueba en ese orden
+_VAL_ANCHORS = (
+    b"tm-player-market-value-development__current-value",
+    b"dataMarktwert",
+    b"Marktwert",
+)
+_VAL_WINDOW = 400
 
 # Carpeta donde se guarda HTML de depuración si algo falla
 _CACHE_DIR = Path("data/_debug_tm")
 _CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
+# Aciertos por dominio: se prueba primero el que más valores ha devuelto
+_DOMAIN_SCORE_PATH = Path("data/tm_domain_scores.json")
+_DOMAIN_SCORE_LOCK = threading.Lock()
+
+
+class MarketValueUnavailable(Exception):
+    """La consulta falló por red/servidor: no se sabe si el jugador tiene valor.
+
+    Distinto de devolver `None` («no encontrado»), que sí es una respuesta
+    válida y se puede cachear.
+    """
+
 
 # ────────────────────────────────────────────────────────────────────────────────
 # Utilidades internas
 # ────────────────────────────────────────────────────────────────────────────────
 
 def _dbg(label: str, value: object) -> None:
-    """Imprime logs de depuración siempre con flush=True."""
-    print(f"[TM DEBUG] {label}: {value}", flush=True)
+    """Log de depuración; con DEBUG desactivado no formatea ni escribe nada."""
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("[TM DEBUG] %s: %s", label, value)
 
 
-def _candidate_player_links(html: str, base: str) -> list[str]:
-    """Extrae todas las URLs de perfil de jugador de la página de resultados."""
-    soup = bs4.BeautifulSoup(html, "lxml")
+def _candidate_player_links(html: bytes, base: str, query: str | None = None) -> list[str]:
+    """Extrae las URLs de perfil de jugador de la página de resultados.
+
+    Solo se aceptan enlaces del mismo dominio `base`. Si se pasa `query`, los
+    candidatos se ordenan por parecido del texto del enlace con el nombre
+    buscado y se devuelven como mucho `_MAX_CANDIDATES`.
+    """
+    tree = LexborHTMLParser(html)
     links: list[str] = []
-    for a in soup.select("a[href*='/profil/spieler/']"):
-        href = a.get("href", "")
+    texts: dict[str, str] = {}
+    for a in tree.css("a[href*='/profil/spieler/']"):
+        href = a.attributes.get("href") or ""
         if not href:
             continue
+        if href.startswith("http") and not href.startswith(base):
+            continue
         full = href if href.startswith("http") else base + href
-        if full not in links:
+        if full not in texts:
             links.append(full)
+            texts[full] = ""
+        # El mismo perfil suele enlazarse desde la foto (sin texto) y el nombre
+        texts[full] = texts[full] or a.text(strip=True)
     if not links:
-        (_CACHE_DIR / "last_search.html").write_text(html[:20_000], "utf-8")
+        (_CACHE_DIR / "last_search.html").write_bytes(html[:20_000])
         _dbg("candidate links", "0 — guardado last_search.html para inspección")
-    else:
-        _dbg("candidate links", links[:5])
+        return links
+
+    if query:
+        scores = {u: fuzz.token_set_ratio(query, normalize(texts[u])) for u in links}
+        links = sorted(links, key=scores.__getitem__, reverse=True)[:_MAX_CANDIDATES]
+    _dbg("candidate links", links[:5])
     return links
 
 
-def _value_from_json(html: str) -> float | None:
+def _value_from_json(html: bytes) -> float | None:
     """Intenta sacar el valor de mercado del bloque JSON interno."""
     m = _JSON_RX.search(html)
     if not m:
         return None
     try:
-        raw_val = int(json.loads(m.group(1)).get("marketValue", 0))
+        raw_val = int(_json_loads(m.group(1)).get("marketValue", 0))
     except (json.JSONDecodeError, ValueError):
         return None
 
@@ -93,14 +166,26 @@ def _value_from_json(html: str) -> float | None:
     return round(euros / 1_000_000, 3)
 
 
-def _value_from_html(html: str) -> float | None:
-    """Fallback: expresión regular sobre el texto visible «€ 25.00 m» o «k»."""
-    m = _VAL_RX.search(html)
+def _value_from_html(html: bytes) -> float | None:
+    """Fallback: expresión regular sobre el texto visible «€ 25.00 m» o «k».
+
+    Primero se busca solo en una ventana corta tras el bloque de valor de
+    mercado; si no hay ancla (o no casa), se recorre la página completa.
+    """
+    m = None
+    for anchor in _VAL_ANCHORS:
+        idx = html.find(anchor)
+        if idx >= 0:
+            m = _VAL_RX.search(html, idx, idx + _VAL_WINDOW)
+            if m:
+                break
+    if not m:
+        m = _VAL_RX.search(html)
     if not m:
         return None
 
-    raw_num, unit = m.groups()
-    raw_num = raw_num.replace(" ", "")  # narrow no‑break space
+    # Solo se decodifica el fragmento capturado
+    raw_num, unit = (g.decode("ascii") for g in m.groups())
 
     # Normaliza separadores decimales
     if "," in raw_num and "." in raw_num:
@@ -124,69 +209,252 @@ def _value_from_html(html: str) -> float | None:
     return round(value, 3)
 
 
+class _TokenBucket:
+    """Token bucket por host: `rate` peticiones/s con ráfagas de hasta `burst`.
+
+    Ante un 429 (o reintentos agotados) se reduce el ritmo a la mitad durante
+    `_BACKOFF_SECS` y, si el servidor manda `Retry-After`, se espera ese tiempo.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._slow_until = 0.0
+        self._not_before = 0.0
+        self._lock = threading.Lock()
+
+    def _rate(self, now: float) -> float:
+        return self.rate / 2 if now < self._slow_until else self.rate
+
+    def take(self) -> None:
+        """Bloquea hasta que haya un token disponible y lo consume."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                rate = self._rate(now)
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * rate)
+                self._last = now
+                if now >= self._not_before and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._not_before - now, (1 - self._tokens) / rate)
+            time.sleep(wait)
+
+    def backoff(self, retry_after: float | None = None) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._slow_until = now + _BACKOFF_SECS
+            if retry_after:
+                self._not_before = max(self._not_before, now + retry_after)
+
+
+def _host_gate(url: str) -> threading.Semaphore:
+    """Semáforo por host: limita las peticiones simultáneas a un mismo dominio."""
+    host = urlsplit(url).netloc
+    with _HOST_GATES_LOCK:
+        return _HOST_GATES.setdefault(host, threading.Semaphore(_PER_HOST_LIMIT))
+
+
+def _host_bucket(url: str) -> _TokenBucket:
+    host = urlsplit(url).netloc
+    with _HOST_GATES_LOCK:
+        return _HOST_BUCKETS.setdefault(host, _TokenBucket(_RATE_PER_HOST, _BURST_PER_HOST))
+
+
+def _retry_after(r: requests.Response) -> float | None:
+    try:
+        return float(r.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+
+def _get(url: str, timeout: int) -> requests.Response:
+    """GET con rate-limit por host (token bucket) y límite de concurrencia."""
+    bucket = _host_bucket(url)
+    bucket.take()
+    with _host_gate(url):
+        try:
+            r = _SESSION.get(url, timeout=timeout)
+        except requests.exceptions.RetryError:
+            bucket.backoff()
+            raise
+    if r.status_code == 429:
+        bucket.backoff(_retry_after(r))
+    return r
+
+
+def _is_not_found(exc: requests.RequestException) -> bool:
+    """Un 4xx (salvo 429) es una respuesta definitiva; el resto, un fallo transitorio."""
+    r = getattr(exc, "response", None)
+    return r is not None and 400 <= r.status_code < 500 and r.status_code != 429
+
+
 def _scrape_profile(url: str) -> float | None:
-    """Scrapea un perfil concreto y devuelve el valor en millones o None."""
+    """Scrapea un perfil concreto y devuelve el valor en millones o None.
+
+    Lanza `MarketValueUnavailable` si la petición falla por red o servidor.
+    """
     _dbg("profile", url)
     try:
-        r = requests.get(url, headers=_HEADERS, timeout=15)
+        r = _get(url, timeout=15)
         r.raise_for_status()
-        html = r.text
+        html = r.content
     except requests.RequestException as exc:
         _dbg("profile req err", exc)
-        return None
+        if _is_not_found(exc):
+            return None
+        raise MarketValueUnavailable(url) from exc
 
     mv = _value_from_json(html) or _value_from_html(html)
     _dbg("scraped value", mv)
     return mv
 
 
+def _search_links(base: str, query: str) -> list[str]:
+    """Lanza la búsqueda en un dominio y devuelve las URLs de perfil candidatas.
+
+    Lanza `MarketValueUnavailable` si la petición falla por red o servidor.
+    """
+    search_url = f"{base}/schnellsuche/ergebnis/schnellsuche?query={quote_plus(query)}"
+    _dbg("search", search_url)
+    try:
+        r = _get(search_url, timeout=12)
+        _dbg("search status", r.status_code)
+        r.raise_for_status()
+    except requests.RequestException as exc:
+        _dbg("search err", exc)
+        if _is_not_found(exc):
+            return []
+        raise MarketValueUnavailable(search_url) from exc
+    return _candidate_player_links(r.content, base, query)
+
+
+def _load_domain_scores() -> dict[str, int]:
+    try:
+        return json.loads(_DOMAIN_SCORE_PATH.read_text("utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _ordered_domains() -> list[str]:
+    """`_BASE_DOMAINS` ordenados por nº de aciertos previos (estable ante empates)."""
+    with _DOMAIN_SCORE_LOCK:
+        scores = dict(_DOMAIN_SCORE)
+    return sorted(_BASE_DOMAINS, key=lambda b: -scores.get(b, 0))
+
+
+def _record_domain_hit(base: str) -> None:
+    with _DOMAIN_SCORE_LOCK:
+        _DOMAIN_SCORE[base] = _DOMAIN_SCORE.get(base, 0) + 1
+        try:
+            # Escritura atómica: temporal + os.replace (un corte no deja el JSON a medias)
+            tmp = _DOMAIN_SCORE_PATH.with_suffix(_DOMAIN_SCORE_PATH.suffix + ".tmp")
+            tmp.write_text(json.dumps(_DOMAIN_SCORE, indent=2), "utf-8")
+            os.replace(tmp, _DOMAIN_SCORE_PATH)
+        except OSError as exc:
+            _dbg("domain score write err", exc)
+
+
+_DOMAIN_SCORE: dict[str, int] = _load_domain_scores()
+
+
 # ────────────────────────────────────────────────────────────────────────────────
 # API pública
 # ────────────────────────────────────────────────────────────────────────────────
 
-@lru_cache(maxsize=512)
+def _canonicalize(query: str) -> str:
+    """Clave de caché: URL sin query/fragmento ni «/» final; nombre normalizado."""
+    query = query.strip()
+    if query.startswith("http"):
+        parts = urlsplit(query)
+        return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip("/"), "", ""))
+    return normalize(query)
+
+
 def get_market_value(query: str) -> float | None:
-    """Devuelve el valor de mercado (M€) o `None`.
+    """Devuelve el valor de mercado (M€) o `None` (no encontrado o fallo de red).
+
+    Para distinguir ambos casos, usar `fetch_market_value`.
 
     * Si `query` comienza por «http», se trata como URL directa.
-    * Si es un nombre, se normaliza y se busca en varios dominios.
-    * El primer perfil que arroje un valor ≠ None se devuelve.
+    * Si es un nombre, se normaliza y se busca en varios dominios en paralelo.
+    * Se respeta el orden de `_BASE_DOMAINS` y de los candidatos: el primer
+      perfil que arroje un valor ≠ None se devuelve.
+
+    La caché se indexa por la forma canónica de `query`, de modo que la misma
+    URL con otra query string (o el mismo nombre con otras mayúsculas/tildes)
+    comparte entrada.
+    """
+    try:
+        return fetch_market_value(query)
+    except MarketValueUnavailable:
+        return None
+
+
+def fetch_market_value(query: str) -> float | None:
+    """Como `get_market_value`, pero un fallo de red lanza `MarketValueUnavailable`.
+
+    `None` significa «no encontrado» y sí se memoiza; los fallos no, así que
+    un corte puntual no deja al jugador sin valor hasta reiniciar.
     """
     _dbg("query", query)
+    return _market_value(_canonicalize(query))
 
+
+@lru_cache(maxsize=512)
+def _market_value(query: str) -> float | None:
     # Caso URL directa
     if query.startswith("http"):
         return _scrape_profile(query)
 
-    # Caso nombre
-    slug = quote_plus(normalize(query))
-    _dbg("slug", slug)
+    # Caso nombre (ya normalizado)
+    _dbg("slug", quote_plus(query))
 
-    for base in _BASE_DOMAINS:
-        search_url = f"{base}/schnellsuche/ergebnis/schnellsuche?query={slug}"
-        _dbg("search", search_url)
-        try:
-            r = requests.get(search_url, headers=_HEADERS, timeout=12)
-            _dbg("search status", r.status_code)
-            r.raise_for_status()
-            for player_url in _candidate_player_links(r.text, base):
-                time.sleep(0.5)  # pequeño delay para no abusar
-                mv = _scrape_profile(player_url)
+    domains = _ordered_domains()
+    # Sin `with`: su salida haría shutdown(wait=True) y esperaría a las
+    # peticiones en curso aunque ya tengamos el valor
+    ex = ThreadPoolExecutor(max_workers=_MAX_WORKERS)
+    failed: MarketValueUnavailable | None = None
+    try:
+        searches = [ex.submit(_search_links, base, query) for base in domains]
+        for base, search in zip(domains, searches):
+            try:
+                urls = search.result()
+            except MarketValueUnavailable as exc:
+                failed = exc
+                continue
+            profiles = [ex.submit(_scrape_profile, url) for url in urls]
+            for fut in profiles:
+                try:
+                    mv = fut.result()
+                except MarketValueUnavailable as exc:
+                    failed = exc
+                    continue
                 if mv is not None:
                     _dbg("return", mv)
+                    _record_domain_hit(base)
                     return mv
-        except requests.RequestException as exc:
-            _dbg("search err", exc)
-            continue
+    finally:
+        ex.shutdown(wait=False, cancel_futures=True)
 
+    # Sin valor y con alguna petición fallida: no es un «no encontrado» fiable
+    if failed is not None:
+        raise failed
     _dbg("result", None)
     return None
 
 
+def get_market_values_batch(names: list[str], max_workers: int = 8) -> dict[str, float | None]:
+    """Valor de mercado (M€) para varios jugadores a la vez: `{nombre: valor}`.
 
-
-
-
-
-
-
+    Las consultas se lanzan en paralelo; el límite por host de `_host_gate`
+    sigue aplicándose, así que el sitio no recibe más carga por ello.
+    """
+    unique = list(dict.fromkeys(names))
+    if not unique:
+        return {}
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        values = list(ex.map(get_market_value, unique))
+    return dict(zip(unique, values))
@@ -23,6 +23,15 @@ PAGES: Dict[str, str | None] = {
     "XI Builder": "pages.xi_builder",
     "Shortlist & Notes": "pages.shortlist",
 }
+
+# app.py is re-executed on every rerun, so a plain lru_cache here would start
+# empty each time; cache_resource keeps the resolved show() across reruns.
+@st.cache_resource(show_spinner=False)
+def _load_page(path: str):
+    """Import a page module once and return its show() (None if missing)."""
+    # Expect a show() function in the page module
+    return getattr(import_module(path), "show", None)
+
 ICONS = {
     "Home": "house",
     "Player Search": "search",
@@ -38,23 +47,26 @@ if "theme" not in st.session_state:
 
 # ——— Global styles (Google Fonts + Bootstrap Icons + CSS) ———————————
 # Tokens for both themes; we alternate values based on st.session_state.theme
-is_dark = st.session_state.theme == "dark"
-css_tokens = f"""
-:root {{
-  --brand: {'#11a56f' if is_dark else '#0b5f35'};
-  --brand-2: {'#35d09d' if is_dark else '#15a06f'};
-  --ink: {'#e9f1ed' if is_dark else '#203028'};
-  --muted: {'#9bb3a7' if is_dark else '#6a7a70'};
-  --bg-1: {'#0e1512' if is_dark else '#f5faf7'};
-  --bg-2: {'#0b110f' if is_dark else '#eef6f1'};
-  --card: {'#0f1714' if is_dark else '#ffffff'};
-  --line: {'#1d2a25' if is_dark else '#e6ece8'};
-  --shadow: 0 8px 24px rgba(0,0,0,.20);
-  --focus: {'#35d09d' if is_dark else '#15a06f'};
-}}
-"""
-
-st.markdown(f"""
+@st.cache_data(show_spinner=False)
+def _global_css(is_dark: bool) -> str:
+    """Full <style> block for one theme; built once per theme, not per rerun."""
+    css_tokens = f"""
+    :root {{
+      --brand: {'#11a56f' if is_dark else '#0b5f35'};
+      --brand-2: {'#35d09d' if is_dark else '#15a06f'};
+      --ink: {'#e9f1ed' if is_dark else '#203028'};
+      --muted: {'#9bb3a7' if is_dark else '#6a7a70'};
+      --bg-1: {'#0e1512' if is_dark else '#f5faf7'};
+      --bg-2: {'#0b110f' if is_dark else '#eef6f1'};
+      --card: {'#0f1714' if is_dark else '#ffffff'};
+      --line: {'#1d2a25' if is_dark else '#e6ece8'};
+      --shadow: 0 8px 24px rgba(0,0,0,.20);
+      --focus: {'#35d09d' if is_dark else '#15a06f'};
+      --brand2: var(--brand-2);
+      --pill: {'rgba(53,208,157,.12)' if is_dark else '#e9fbf3'};
+    }}
+    """
+    return f"""
 <style>
 @import url('https://fonts.googleapis.com/css2?family=Poppins:wght@300;400;600;700&display=swap');
 @import url('https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.3/font/bootstrap-icons.min.css');
@@ -178,7 +190,10 @@ div.stButton > button:hover{{ background: rgba(53,208,157,.18); transform: trans
 /* Footer */
 .footer{{ color: var(--muted); font-size:.92rem; text-align:center; margin-top: 28px; }}
 </style>
-""", unsafe_allow_html=True)
+"""
+
+is_dark = st.session_state.theme == "dark"
+st.markdown(_global_css(is_dark), unsafe_allow_html=True)
 
 # ——— Sidebar ————————————————————————————
 with st.sidebar:
@@ -281,10 +296,9 @@ else:
     if module_path:
         try:
             with st.spinner("Loading…"):
-                module = import_module(module_path)
-                # Expect a show() function in the page module
-                if hasattr(module, "show"):
-                    module.show()
+                show = _load_page(module_path)
+                if show:
+                    show()
                 else:
                     st.error(f"The page '{page}' does not expose a show() function.")
         except Exception as e:
@@ -1,4 +1,5 @@
 # components/pitch.py
+import base64
 import streamlit as st
 from pathlib import Path
 
@@ -25,17 +26,31 @@ POS_COORDS_433 = {
     "LW":  (15, 25), "ST":  (50, 20), "RW": (85, 25),
 }
 
+@st.cache_resource(show_spinner=False)
+def _pitch_data_uri() -> str | None:
+    """`pitch.png` como data URI: el navegador no puede pedir una ruta local.
+
+    Se lee y codifica una vez por proceso; None si el asset no existe.
+    """
+    try:
+        raw = Path(FIELD_IMG).read_bytes()
+    except OSError:
+        return None
+    return "data:image/png;base64," + base64.b64encode(raw).decode("ascii")
+
 def draw_pitch(squad):
-    st.markdown(CSS, unsafe_allow_html=True)
-    st.markdown('<div class="pitch-container">', unsafe_allow_html=True)
-    st.markdown(f'<img src="{FIELD_IMG}">', unsafe_allow_html=True)
+    # Todo el campo en un único st.markdown (un solo mensaje al frontend)
+    parts = [CSS, '<div class="pitch-container">']
+    src = _pitch_data_uri()
+    if src:
+        parts.append(f'<img src="{src}">')
 
     coords = POS_COORDS_433  # TODO: mapear según formación
     for pos, (x, y) in coords.items():
         label = squad.slots[pos].player["name"].split()[0] if squad.slots[pos].player else pos
-        st.markdown(
+        parts.append(
             f'<div class="slot" style="left:{x}%; top:{y}%" '
-            f'onclick="window.parent.postMessage({{slot:\'{pos}\'}}, \'*\')">{label}</div>',
-            unsafe_allow_html=True,
+            f'onclick="window.parent.postMessage({{slot:\'{pos}\'}}, \'*\')">{label}</div>'
         )
-    st.markdown('</div>', unsafe_allow_html=True)
+    parts.append('</div>')
+    st.markdown("".join(parts), unsafe_allow_html=True)
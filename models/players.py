@@ -1,7 +1,10 @@
 from __future__ import annotations
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 class Player(BaseModel):
+    # Inmutable y hashable: puede usarse como clave de caché
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     name: str
     age: int | None = None
     position: str | None = None
@@ -8,27 +8,45 @@ Visual and UX improvements without changing functionality:
 from __future__ import annotations
 
 import json
+import os
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from io import BytesIO
+from typing import TYPE_CHECKING
 from urllib.parse import quote_plus
 
-import requests
 import streamlit as st
-from bs4 import BeautifulSoup
-from rapidfuzz import process
-from PIL import Image
 
-from services.player_service import fetch_player
 from utils.text import normalize
-from adaptors.soccerdata_fbref import FBrefStats
+
+try:
+    import orjson
+
+    def _json_dumps(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    _json_loads = orjson.loads
+except ImportError:
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+    _json_loads = json.loads
+
+# The scraping/data stack (requests, bs4, lxml, soccerdata, rapidfuzz) is imported
+# inside the functions that use it, so loading this module stays cheap.
+if TYPE_CHECKING:
+    import pandas as pd
 
 # ───────────────────── Constants ──────────────────────────────
+# Same names are normalized over and over (index build, queries, TM rows)
+_norm = lru_cache(maxsize=65536)(normalize)
+
 _DOMAINS = [
     "https://www.transfermarkt.com",
     "https://www.transfermarkt.es",
     "https://www.transfermarkt.de",
 ]
 _HEADERS = {"User-Agent": "Mozilla/5.0 (ScoutingApp)"}
+_HTTP_CACHE = Path("data/http_cache.sqlite")
+_HTTP_TTL = 6*60*60
 FAV_PATH = Path("data/favorites.json")
 FAV_PATH.parent.mkdir(exist_ok=True)
 
@@ -40,63 +58,127 @@ def _safe_rerun():
         _rerun()
 
 # ───────────────────── Favorites helpers ──────────────────────
+# The session keeps its own copy: the file is read once, not on every rerun.
 def _load_favs() -> list[str]:
+    favs = st.session_state.get("_favs")
+    if favs is not None:
+        return favs
     try:
-        return json.loads(FAV_PATH.read_text()) if FAV_PATH.exists() else []
-    except json.JSONDecodeError:
-        return []
+        favs = _json_loads(FAV_PATH.read_bytes()) if FAV_PATH.exists() else []
+    except json.JSONDecodeError:  # orjson's error subclasses it
+        favs = []
+    st.session_state["_favs"] = favs
+    return favs
 
 def _save_favs(lst: list[str]):
-    FAV_PATH.write_text(json.dumps(sorted(set(lst)), indent=2, ensure_ascii=False))
+    favs = sorted(set(lst))
+    st.session_state["_favs"] = favs
+    # Write to a temp file and swap it in, so a crash never leaves half a file
+    tmp = FAV_PATH.with_suffix(".tmp")
+    tmp.write_bytes(_json_dumps(favs))
+    os.replace(tmp, FAV_PATH)
 
 # ───────────────────── Scraping helpers ───────────────────────
+@lru_cache(maxsize=1)
+def _session():
+    """Shared keep-alive session (created on first scrape, not at import).
+
+    Responses are also kept in a SQLite cache, so restarts don't re-scrape.
+    """
+    from utils.http import make_session
+    return make_session(_HEADERS, cache_path=str(_HTTP_CACHE), expire_after=_HTTP_TTL)
+
+def _probe_domain(base: str, slug: str, team_norm: str | None) -> str | None:
+    """Player profile URL from one Transfermarkt domain's quick search."""
+    import requests
+    from lxml import etree
+    from lxml import html as lxml_html
+
+    try:
+        r = _session().get(f"{base}/schnellsuche/ergebnis/schnellsuche?query={slug}", timeout=15)
+        tree = lxml_html.fromstring(r.content)
+    except (requests.RequestException, etree.ParserError):
+        return None
+    links = tree.xpath("//a[contains(@href,'/profil/spieler/')]")
+    for a in links:
+        row = next(a.iterancestors("tr"), None)  # closest <tr>, like find_parent
+        if row is None:
+            continue
+        if team_norm and team_norm not in _norm(row.text_content()):
+            continue
+        href = a.get("href")
+        return href if href.startswith("http") else base + href
+    if links:
+        href = links[0].get("href")
+        return href if href.startswith("http") else base + href
+    return None
+
 @st.cache_data(ttl=6*60*60)
 def _resolve_profile_url(name: str, team: str | None) -> str | None:
-    slug = quote_plus(normalize(name))
-    team_norm = normalize(team) if team else None
-    for base in _DOMAINS:
-        try:
-            html = requests.get(f"{base}/schnellsuche/ergebnis/schnellsuche?query={slug}", headers=_HEADERS, timeout=15).text
-        except requests.RequestException:
-            continue
-        soup = BeautifulSoup(html, "lxml")
-        for a in soup.select("a[href*='/profil/spieler/']"):
-            row = a.find_parent("tr")
-            if row is None:
-                continue
-            if team_norm and team_norm not in normalize(row.text):
-                continue
-            href = a["href"]
-            return href if href.startswith("http") else base + href
-        first = soup.select_one("a[href*='/profil/spieler/']")
-        if first:
-            href = first["href"]
-            return href if href.startswith("http") else base + href
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    slug = quote_plus(_norm(name))
+    team_norm = _norm(team) if team else None
+    # All domains are probed at once; the first one that finds a profile wins
+    ex = ThreadPoolExecutor(max_workers=len(_DOMAINS))
+    try:
+        futures = [ex.submit(_probe_domain, base, slug, team_norm) for base in _DOMAINS]
+        for fut in as_completed(futures):
+            url = fut.result()
+            if url:
+                return url
+    finally:
+        ex.shutdown(wait=False, cancel_futures=True)
     return None
 
 @st.cache_data(ttl=6*60*60)
-def _get_photo(url: str | None) -> Image.Image | None:
+def _get_photo(url: str | None) -> bytes | None:
+    """Raw image bytes of the player's photo; st.image serves them as-is."""
     if not url:
         return None
+    from bs4 import BeautifulSoup
+
     try:
-        html = requests.get(url, headers=_HEADERS, timeout=15).text
-        meta = BeautifulSoup(html, "lxml").find("meta", property="og:image")
+        r = _session().get(url, timeout=15)
+        meta = BeautifulSoup(r.content, "lxml", from_encoding=r.encoding).find("meta", property="og:image")
         if meta and meta.get("content"):
-            resp = requests.get(meta["content"].replace("amp;", ""), headers=_HEADERS, timeout=10)
+            resp = _session().get(meta["content"].replace("amp;", ""), timeout=10)
             resp.raise_for_status()
-            return Image.open(BytesIO(resp.content))
+            if resp.headers.get("Content-Type", "").startswith("image/"):
+                return resp.content
     except Exception:
         return None
 
-@st.cache_data(ttl=6*60*60)
-def _player_index_cached():
-    fb = FBrefStats()
-    df = fb._fb.read_player_season_stats(stat_type="standard").reset_index()
-    return df["player"].unique().tolist()
+@st.cache_data(ttl=3600, show_spinner=False)
+def _cached_player_stats(name: str):
+    """FBref stats only; stable for hours, so reruns reuse them."""
+    from services.player_service import fetch_player_stats
+    return fetch_player_stats(name)
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _cached_market_value(name: str):
+    """Raises MarketValueUnavailable on network failure; exceptions are not cached."""
+    from adaptors.transfermarkt import fetch_market_value
+    return fetch_market_value(name)
+
+def _cached_fetch_player(name: str):
+    """Player stats + market value, cached separately so a failed Transfermarkt
+    lookup shows no value now and is retried on the next rerun."""
+    from adaptors.transfermarkt import MarketValueUnavailable
+    player = _cached_player_stats(name)
+    if player is None:
+        return None
+    try:
+        mv = _cached_market_value(name)
+    except MarketValueUnavailable:
+        mv = None
+    return player.model_copy(update={"market_value_mil": mv})
 
-@st.cache_data(ttl=86400, show_spinner=False)
+@st.cache_resource(show_spinner=False)
 def _player_index_df_cached():
     """Returns a player index with metadata (league, position, season, age)."""
+    from adaptors.soccerdata_fbref import FBrefStats
+
     fb = FBrefStats()
     try:
         df = fb._fb.read_player_season_stats(stat_type="standard").reset_index()
@@ -110,40 +192,122 @@ def _player_index_df_cached():
                 return df[c]
         return None
 
+    import numpy as np
     import pandas as pd
-    out = pd.DataFrame({
-        "player":  pick(df, ["player","Player","name","Name"]),
-        "pos":     pick(df, ["pos","Pos","position","Position"]),
-        "team":    pick(df, ["team","Team","squad","Squad"]),
-        "league":  pick(df, ["league","League","comp","Comp","competition","Competition"]),
-        "season":  pick(df, ["season","Season"]),
-        "age":     pick(df, ["age","Age"]),
-    })
-
-    out = out.dropna(subset=["player"]).copy()
-    out["season"] = out["season"].astype(str).str.strip()
-    out["pos"] = out["pos"].astype(str).str.upper().str.strip()
+
+    def text_cat(col, upper=False):
+        # String dtype cleanup, then categoricals: filters compare compact integer codes
+        if col is None:  # column missing from this FBref export: keep it empty
+            return None
+        col = col.astype("string").str.strip()
+        return (col.str.upper() if upper else col).astype("category")
+
+    age = pick(df, ["age","Age"])
     try:
-        out["age"] = out["age"].astype(float)
+        age = age.astype(np.float32)
     except Exception:
         pass
+
+    # Columns are cleaned while building the frame, so no copy is needed after dropna
+    out = pd.DataFrame({
+        "player":  pick(df, ["player","Player","name","Name"]),
+        "pos":     text_cat(pick(df, ["pos","Pos","position","Position"]), upper=True),
+        "team":    pick(df, ["team","Team","squad","Squad"]),
+        "league":  text_cat(pick(df, ["league","League","comp","Comp","competition","Competition"])),
+        "season":  text_cat(pick(df, ["season","Season"])),
+        "age":     age,
+    }).dropna(subset=["player"])
     return out
 
+@dataclass(frozen=True)
+class _PlayerIndex:
+    names: tuple[str, ...]
+    df: pd.DataFrame
+    facets: dict
+    prefixes: dict[str, tuple[int, ...]]
+
+# Names are indexed by the first letters of each normalized token (first name
+# or surname), so fuzzy matching only scores names sharing a token prefix.
+_PREFIX_LEN = 3
+
+def _prefix_map(names) -> dict[str, tuple[int, ...]]:
+    out: dict[str, list[int]] = {}
+    for i, n in enumerate(names):
+        for tok in set(_norm(n).split()):
+            if len(tok) >= _PREFIX_LEN:
+                out.setdefault(tok[:_PREFIX_LEN], []).append(i)
+    return {k: tuple(v) for k, v in out.items()}
+
+def _candidates(index: _PlayerIndex, query: str) -> list[str] | None:
+    """Names sharing a token prefix with the query; None means scan everything."""
+    keys = {tok[:_PREFIX_LEN] for tok in _norm(query).split() if len(tok) >= _PREFIX_LEN}
+    hits: set[int] = set()
+    for k in keys:
+        hits.update(index.prefixes.get(k, ()))
+    if not hits:
+        return None
+    return [index.names[i] for i in sorted(hits)]
+
+def _facet_values(col) -> list[str]:
+    return [x for x in col.dropna().unique().tolist() if x and x != "None"]
+
+def _facets(df) -> dict:
+    """Filter options (leagues, positions, seasons, age range) for the UI."""
+    if df.empty:
+        return {"leagues": [], "positions": [], "seasons": [], "age": None}
+    age = None
+    if "age" in df.columns and df["age"].notna().any():
+        try:
+            ages = df["age"].dropna().astype(float)
+            age = (int(ages.min()), int(ages.max()))
+        except Exception:
+            age = None
+    return {
+        "leagues": sorted(_facet_values(df["league"])),
+        "positions": sorted(_facet_values(df["pos"])),
+        "seasons": sorted(_facet_values(df["season"]), reverse=True),
+        "age": age,
+    }
+
+@st.cache_resource(show_spinner=False)
+def _player_index() -> _PlayerIndex:
+    """Process-wide player index (one FBref read shared by all sessions).
+
+    Held by reference, not pickled: callers must not mutate `df`.
+    """
+    df = _player_index_df_cached()
+    names = tuple(df["player"].dropna().unique().tolist()) if not df.empty else ()
+    return _PlayerIndex(names=names, df=df, facets=_facets(df), prefixes=_prefix_map(names))
+
+def _refresh_player_index():
+    _player_index_df_cached.clear()
+    _player_index.clear()
+
+def _cat_mask(col, selected):
+    """Membership test on a categorical column's integer codes."""
+    import numpy as np
+    wanted = col.cat.categories.get_indexer(list(selected))
+    return np.isin(col.cat.codes.to_numpy(), wanted[wanted >= 0])
+
 def _apply_filters(df, leagues=None, positions=None, seasons=None, age_range=None):
     import numpy as np
     if df is None or df.empty:
         return df
     mask = np.ones(len(df), dtype=bool)
+    # league/pos/season are categoricals (see _player_index_df_cached)
     if leagues:
-        mask &= df["league"].astype(str).isin(leagues)
+        mask &= _cat_mask(df["league"], leagues)
     if positions:
-        mask &= df["pos"].astype(str).isin(positions)
+        mask &= _cat_mask(df["pos"], positions)
     if seasons:
-        mask &= df["season"].astype(str).isin(seasons)
+        mask &= _cat_mask(df["season"], seasons)
     if age_range and all(age_range):
         lo, hi = age_range
         try:
-            mask &= df["age"].astype(float).between(float(lo), float(hi), inclusive="both")
+            age = df["age"]
+            if age.dtype.kind != "f":
+                age = age.astype(float)
+            mask &= age.between(float(lo), float(hi), inclusive="both").to_numpy()
         except Exception:
             pass
     return df[mask]
@@ -151,21 +315,10 @@ def _apply_filters(df, leagues=None, positions=None, seasons=None, age_range=Non
 # ───────────────────── UI helpers ─────────────────────────────
 _ICON = {"g": "⚽", "a": "🎯", "xg": "📈", "min": "⏱️"}
 
-def _inject_css():
-    # Use tokens from app.py if present; define safe fallbacks.
-    st.markdown("""
+# Theme tokens (--brand, --brand2, --pill, ...) come from app.py's global CSS;
+# redefining them here as var(--x, fallback) made them cyclic and invalid.
+_CSS = """
     <style>
-    :root{
-      --brand: var(--brand, #0b5f35);
-      --brand2: var(--brand-2, #15a06f);
-      --ink: var(--ink, #203028);
-      --muted: var(--muted, #6a7a70);
-      --card: var(--card, #ffffff);
-      --line: var(--line, #e6ece8);
-      --shadow: var(--shadow, 0 8px 24px rgba(0,0,0,.06));
-      --pill: var(--pill, #e9fbf3);
-      --focus: var(--focus, #15a06f);
-    }
     *{ font-family: 'Poppins', system-ui, -apple-system, Segoe UI, Roboto, Arial, sans-serif; }
     .block-container{ max-width: 1200px; }
 
@@ -234,14 +387,16 @@ def _inject_css():
     .sources a{ color: var(--brand); text-decoration: none; font-weight: 700; }
     .sources a:hover{ text-decoration: underline; }
     </style>
-    """, unsafe_allow_html=True)
+    """
+
+def _inject_css():
+    st.markdown(_CSS, unsafe_allow_html=True)
 
 def _header(photo, p, favs):
-    _inject_css()
     st.markdown(f"<div class='profile'>", unsafe_allow_html=True)
     img_col, info_col = st.columns([1, 3])
     with img_col:
-        st.image(photo or "https://placehold.co/200x240?text=No+Photo", width=200, output_format="PNG")
+        st.image(photo or "https://placehold.co/200x240?text=No+Photo", width=200)
     with info_col:
         st.markdown(f"<h2>{p.name}</h2>", unsafe_allow_html=True)
         st.markdown(
@@ -282,24 +437,28 @@ def _stat_card(label, value, color):
         unsafe_allow_html=True,
     )
 
+def _pick_chip(key: str):
+    """on_change for the chip pills: search the picked name, then clear the pill."""
+    picked = st.session_state.get(key)
+    if picked:
+        st.session_state["search_query"] = picked
+    st.session_state[key] = None
+
 # ───────────────────── main page ───────────────────────────────
 def show():
+    from utils.fuzzy import top_matches
+
     _inject_css()
     st.header("🏟️ Player Search", divider="grey")
     st.caption("Search players, review key metrics, and save favorites for quick access.")
 
     # —— Favorites expander ——
+    # Chips are one st.pills widget per group, not one st.button per name
     with st.expander("⭐ Favorites", expanded=False):
         favs = _load_favs()
         if favs:
-            cols = st.columns(2)
-            for i, name in enumerate(favs):
-                with cols[i % 2]:
-                    st.markdown("<div class='chip'>", unsafe_allow_html=True)
-                    if st.button(name, key=f"fav_{name}"):
-                        st.session_state["search_query"] = name
-                        _safe_rerun()
-                    st.markdown("</div>", unsafe_allow_html=True)
+            st.pills("Favorites", favs, key="chips_fav", label_visibility="collapsed",
+                     on_change=_pick_chip, args=("chips_fav",))
         else:
             st.info("Empty — search players and star them ⭐")
 
@@ -307,23 +466,32 @@ def show():
     recs = st.session_state.get("recent_queries", [])
     if recs:
         st.markdown("#### Recent")
-        rcols = st.columns(min(4, len(recs)))
-        for i, q in enumerate(recs[:8]):
-            with rcols[i % len(rcols)]:
-                st.markdown("<div class='chip'>", unsafe_allow_html=True)
-                if st.button(q, key=f"recent_{i}"):
-                    st.session_state["search_query"] = q
-                    _safe_rerun()
-                st.markdown("</div>", unsafe_allow_html=True)
+        st.pills("Recent", recs[:8], key="chips_recent", label_visibility="collapsed",
+                 on_change=_pick_chip, args=("chips_recent",))
+
+    if st.sidebar.button("🔄 Refresh player index", use_container_width=True):
+        _refresh_player_index()
+
+    # —— Search with suggestions ——
+    query = st.text_input(
+        "Player name",
+        value=st.session_state.get("search_query", ""),
+        key="search_input",
+        help="Type a name: we suggest up to 5 matches (fuzzy match)."
+    )
+    if not query:
+        # Nothing to search yet: don't load the FBref index or build the filters
+        st.info("Start by typing a name…")
+        st.stop()
 
     # —— Quick filters ——
-    idx_df = _player_index_df_cached()
+    index = _player_index()
+    idx_df = index.df
     if idx_df is not None and not idx_df.empty:
         with st.expander("🔎 Quick filters", expanded=False):
             c1, c2, c3, c4 = st.columns(4)
-            leagues = sorted([x for x in idx_df["league"].dropna().astype(str).unique().tolist() if x and x != "None"])
-            positions = sorted([x for x in idx_df["pos"].dropna().astype(str).unique().tolist() if x and x != "None"])
-            seasons = sorted([x for x in idx_df["season"].dropna().astype(str).unique().tolist() if x and x != "None"], reverse=True)
+            facets = index.facets
+            leagues, positions, seasons = facets["leagues"], facets["positions"], facets["seasons"]
 
             sel_leagues = c1.multiselect("League", leagues, key="flt_leagues")
             sel_positions = c2.multiselect("Position", positions, key="flt_positions")
@@ -331,32 +499,25 @@ def show():
             sel_seasons = c3.multiselect("Season", seasons, default=default_season, key="flt_seasons")
 
             # Age range if available
-            if "age" in idx_df.columns and idx_df["age"].notna().any():
-                try:
-                    a_min = int(idx_df["age"].dropna().astype(float).min())
-                    a_max = int(idx_df["age"].dropna().astype(float).max())
-                    sel_age = c4.slider("Age", min_value=a_min, max_value=a_max, value=(a_min, a_max), key="flt_age")
-                except Exception:
-                    sel_age = None
+            if facets["age"]:
+                a_min, a_max = facets["age"]
+                sel_age = c4.slider("Age", min_value=a_min, max_value=a_max, value=(a_min, a_max), key="flt_age")
             else:
                 sel_age = None
     else:
         sel_leagues = sel_positions = sel_seasons = []
         sel_age = None
 
-    # —— Search with suggestions ——
-    query = st.text_input(
-        "Player name",
-        value=st.session_state.get("search_query", ""),
-        key="search_input",
-        help="Type a name: we suggest up to 5 matches (fuzzy match)."
-    )
-    if not query:
-        st.stop()
-
-    names_df = _apply_filters(idx_df, sel_leagues, sel_positions, sel_seasons, sel_age)
-    names = (names_df['player'].dropna().unique().tolist() if names_df is not None and not names_df.empty else [])
-    suggestions = [h for h, sc, _ in process.extract(query, names, limit=5, score_cutoff=70)]
+    candidates = _candidates(index, query)
+    if sel_leagues or sel_positions or sel_seasons or sel_age:
+        names_df = _apply_filters(idx_df, sel_leagues, sel_positions, sel_seasons, sel_age)
+        names = (names_df['player'].dropna().unique().tolist() if names_df is not None and not names_df.empty else [])
+        if candidates is not None:
+            allowed = set(names)
+            names = [n for n in candidates if n in allowed] or names
+    else:
+        names = candidates if candidates is not None else list(index.names)
+    suggestions = top_matches(query, names, limit=5, score_cutoff=70)
     selected = st.selectbox("Matches", suggestions or [query]) if suggestions else query
 
     with st.spinner("Fetching data…"):
@@ -365,7 +526,7 @@ def show():
         if selected not in _recs:
             st.session_state["recent_queries"] = [selected] + _recs[:7]
 
-        player = fetch_player(selected)
+        player = _cached_fetch_player(selected)
         if player is None:
             st.error(f"No information found for **{selected}**.")
             st.stop()
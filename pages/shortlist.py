@@ -6,12 +6,13 @@ from typing import List, Dict
 
 import streamlit as st
 import pandas as pd
+import pyarrow as pa
 
 from services.shortlist_service import (
     SHORTLISTS_DIR, SCHEMA_VERSION,
     list_shortlists, load_shortlist, save_shortlist,
     create_shortlist_if_missing, delete_shortlist,
-    add_entry, update_entry, delete_entry,
+    open_shortlist,
     export_shortlist_to_csv, import_shortlist_from_csv
 )
 
@@ -41,6 +42,39 @@ def _inject_css():
     </style>
     """, unsafe_allow_html=True)
 
+# ——— Filtered view ———
+@st.cache_data(max_entries=64, show_spinner=False)
+def _filtered_view(sl_name: str, mtime_ns: int, pos: tuple, status: tuple, tags: tuple,
+                   min_rating: int, max_age: int) -> pa.Table | pd.DataFrame:
+    """Filtered table as Arrow; `mtime_ns` keys the cache to the shortlist file version."""
+    entries = load_shortlist(sl_name).get("entries", [])
+    # One vectorized boolean mask instead of a per-entry Python check
+    df = pd.DataFrame(entries, columns=[
+        "id","name","position","team","league","age","value_mil","rating","status","tags","notes","updated_at"
+    ])
+    # Low-cardinality text columns as categoricals: isin() compares small int codes
+    for c in ("position", "status", "league"):
+        df[c] = df[c].astype("category")
+    mask = pd.Series(True, index=df.index)
+    if pos:
+        mask &= df["position"].isin(pos)
+    if status:
+        mask &= df["status"].isin(status)
+    if tags:
+        required = frozenset(tags)
+        tag_sets = df["tags"].fillna("").astype(str).str.split(",").map(
+            lambda xs: frozenset(t.strip() for t in xs if t.strip())
+        )
+        mask &= tag_sets.map(required.issubset).astype(bool)
+    mask &= pd.to_numeric(df["rating"], errors="coerce").fillna(0) >= min_rating
+    if max_age:
+        mask &= ~(pd.to_numeric(df["age"], errors="coerce") > float(max_age))
+    view = df.loc[mask].drop(columns=["id"])
+    try:
+        return pa.Table.from_pandas(view, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return view  # mixed-type columns: let Streamlit's own Arrow conversion fix them up
+
 # ——— Page ———
 def show():
     _inject_css()
@@ -81,43 +115,34 @@ def show():
     # Delete shortlist button
     with st.expander("⚠️ Delete shortlist (irreversible)"):
         if st.button("Delete current shortlist"):
-            delete_shortlist(st.session_state.sl_name)
-            st.session_state.sl_name = (list_shortlists()[0] if list_shortlists() else "default")
+            deleted = st.session_state.sl_name
+            delete_shortlist(deleted)
+            # Reuse the listing from the top of show() instead of rescanning the directory
+            remaining = [s for s in all_sls if s != deleted]
+            st.session_state.sl_name = (remaining[0] if remaining else "default")
             _safe_rerun()
 
-    # Load data
-    data = load_shortlist(st.session_state.sl_name)
+    # Load data (one in-memory handle per shortlist and session; edits below flush once)
+    handle = open_shortlist(st.session_state.sl_name, st.session_state.setdefault("sl_handles", {}))
+    data = handle.data
     entries: List[Dict] = data.get("entries", [])
 
     # Filters
     with st.expander("🔎 Filters", expanded=False):
         c1,c2,c3,c4,c5 = st.columns(5)
-        pos = c1.multiselect("Position", sorted({e.get("position","") for e in entries if e.get("position")}), [])
+        facets = data.get("_index", {})  # precomputed by the service on save/load
+        pos = c1.multiselect("Position", facets.get("positions", []), [])
         status = c2.multiselect("Status", ["Scouting","Follow","Target","Rejected","Signed"], [])
-        tags_all = sorted({t.strip() for e in entries for t in (e.get("tags","") or "").split(",") if t.strip()})
-        tags = c3.multiselect("Tags", tags_all, [])
+        tags = c3.multiselect("Tags", facets.get("tags", []), [])
         min_rating = c4.slider("Minimum rating", 1, 5, 1)
         max_age = c5.number_input("Max age", min_value=0, max_value=60, value=60, step=1)
 
-    # Main table
-    def _match_filters(e: Dict) -> bool:
-        if pos and (e.get("position") or "") not in pos: return False
-        if status and (e.get("status") or "") not in status: return False
-        if tags:
-            e_tags = {t.strip() for t in (e.get("tags","") or "").split(",") if t.strip()}
-            if not set(tags).issubset(e_tags): return False
-        if int(e.get("rating", 0) or 0) < min_rating: return False
-        try:
-            if max_age and e.get("age") and float(e["age"]) > float(max_age): return False
-        except Exception:
-            pass
-        return True
-
-    filtered = [e for e in entries if _match_filters(e)]
-    df = pd.DataFrame(filtered) if filtered else pd.DataFrame(columns=[
-        "id","name","position","team","league","age","value_mil","rating","status","tags","notes","updated_at"
-    ])
-    st.dataframe(df.drop(columns=["id"], errors="ignore"), use_container_width=True)
+    # Main table: cached per (shortlist version, filters), so unchanged filters skip the rebuild
+    st.dataframe(
+        _filtered_view(st.session_state.sl_name, handle.mtime_ns,
+                       tuple(pos), tuple(status), tuple(tags), min_rating, max_age),
+        use_container_width=True,
+    )
 
     st.divider()
     st.subheader("Add / Edit entry")
@@ -168,19 +193,21 @@ def show():
             existing = next((e for e in entries if e.get("name","").lower()==payload["name"].lower()
                              and e.get("team","").lower()==payload["team"].lower()
                              and e.get("position","").lower()==payload["position"].lower()), None)
-            if existing:
-                update_entry(st.session_state.sl_name, existing["id"], payload)
-                st.success("Entry updated.")
-            else:
-                add_entry(st.session_state.sl_name, payload)
-                st.success("Entry added.")
+            with handle:
+                if existing:
+                    handle.update(existing["id"], payload)
+                    st.success("Entry updated.")
+                else:
+                    handle.add(payload)
+                    st.success("Entry added.")
             _safe_rerun()
 
     if clear:
         for k in ("Name*","Position","Team","League","Notes","Tags (comma-separated)"): pass  # UI does not keep keys here
 
     if del_id and st.button("Delete by ID"):
-        ok = delete_entry(st.session_state.sl_name, del_id.strip())
+        with handle:
+            ok = handle.delete(del_id.strip())
         if ok:
             st.success("Deleted.")
             _safe_rerun()
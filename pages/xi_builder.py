@@ -3,33 +3,52 @@
 
 from __future__ import annotations
 
+import html
 import os
+from functools import lru_cache
 from pathlib import Path
 import streamlit as st
-from rapidfuzz import process
 
 from services.xi_service import (
-    Squad, FORMATIONS, load_player_pool, score_players,
+    Squad, FORMATIONS, load_player_pool,
     add_market_values, optimize_xi, compare_squads
 )
 from services.player_service import fetch_player
 from adaptors.soccerdata_fbref import FBrefStats
+from utils.fuzzy import top_matches
+
+try:  # in requirements.txt, but also needs the system cairo library; inline SVG otherwise
+    import cairosvg
+except (ImportError, OSError):
+    cairosvg = None
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
 
 SQUADS_DIR = Path("data/squads")
 SQUADS_DIR.mkdir(parents=True, exist_ok=True)
 
-def _is_valid_squad_file(name: str) -> bool:
-    p = SQUADS_DIR / f"{name}.json"
+@lru_cache(maxsize=256)
+def _is_valid_squad_cached(path: str, mtime: float) -> bool:
+    """Parses a squad file once per (path, mtime); unchanged files skip the read."""
     try:
-        import json
-        raw = p.read_text(encoding="utf-8")
+        raw = Path(path).read_bytes()
         if not raw.strip():
             return False
-        d = json.loads(raw)
+        d = _json.loads(raw)
         return isinstance(d, dict) and "formation" in d and "slots" in d
     except Exception:
         return False
 
+def _is_valid_squad_file(name: str) -> bool:
+    p = SQUADS_DIR / f"{name}.json"
+    try:
+        mtime = p.stat().st_mtime
+    except OSError:
+        return False
+    return _is_valid_squad_cached(str(p), mtime)
+
 def _safe_rerun():
     try:
         st.rerun()
@@ -106,40 +125,60 @@ def _inject_css():
     """, unsafe_allow_html=True)
 
 # ——— Pitch with improved SVG (visual only) ———
-def _draw_pitch(squad: Squad, orientation: str = "vertical"):
-    from streamlit.components.v1 import html as st_html
-
-    if orientation not in {"vertical", "horizontal"}:
-        orientation = "vertical"
-
+# Player coordinates per formation on the horizontal (1200x800) and vertical
+# (800x1200) canvases.
+_COORDS_H = {
+    "4-3-3": {
+        "GK":(600,760),
+        "LB":(200,620),"LCB":(420,650),"RCB":(780,650),"RB":(1000,620),
+        "LCM":(420,480),"CM":(600,450),"RCM":(780,480),
+        "LW":(260,260),"ST":(600,200),"RW":(940,260)
+    },
+    "4-2-3-1": {
+        "GK":(600,760),
+        "LB":(200,620),"LCB":(420,650),"RCB":(780,650),"RB":(1000,620),
+        "LDM":(470,520),"CDM":(600,520),"RDM":(730,520),
+        "LAM":(420,360),"CAM":(600,340),"RAM":(780,360),
+        "ST":(600,210)
+    },
+    "4-4-2": {
+        "GK":(600,760),
+        "LB":(200,620),"LCB":(420,650),"RCB":(780,650),"RB":(1000,620),
+        "LM":(320,430),"LCM":(500,430),"RCM":(700,430),"RM":(880,430),
+        "LS":(520,250),"RS":(680,250)
+    },
+}
+
+_COORDS_V = {
+    "4-3-3": {
+        "GK":(400,1120),
+        "LB":(150, 930), "LCB":(300, 970), "RCB":(500, 970), "RB":(650, 930),
+        "LCM":(300, 720), "CM":(400, 690), "RCM":(500, 720),
+        "LW":(190, 440), "ST":(400, 360), "RW":(610, 440),
+    },
+    "4-2-3-1": {
+        "GK":(400,1120),
+        "LB":(150, 930), "LCB":(300, 970), "RCB":(500, 970), "RB":(650, 930),
+        "LDM":(320, 790), "CDM":(400, 790), "RDM":(480, 790),
+        "LAM":(300, 560), "CAM":(400, 540), "RAM":(500, 560),
+        "ST":(400, 380),
+    },
+    "4-4-2": {
+        "GK":(400,1120),
+        "LB":(150, 930), "LCB":(300, 970), "RCB":(500, 970), "RB":(650, 930),
+        "LM":(240, 690), "LCM":(340, 690), "RCM":(460, 690), "RM":(560, 690),
+        "LS":(360, 420), "RS":(440, 420),
+    },
+}
+
+def _pitch_prefix(orientation: str) -> tuple[str, int]:
+    """Static pitch SVG (everything except the players) and iframe height."""
     # Canvases: horizontal (1200x800) or vertical (800x1200)
     if orientation == "horizontal":
         width, height = 1200, 800
         rect_x, rect_y, rect_w, rect_h, r = 20, 20, width-40, height-40, 16
         mid_line = {"x1": width/2, "y1": 20, "x2": width/2, "y2": height-20}
         center = (width/2, height/2)
-        COORDS = {
-            "4-3-3": {
-                "GK":(600,760),
-                "LB":(200,620),"LCB":(420,650),"RCB":(780,650),"RB":(1000,620),
-                "LCM":(420,480),"CM":(600,450),"RCM":(780,480),
-                "LW":(260,260),"ST":(600,200),"RW":(940,260)
-            },
-            "4-2-3-1": {
-                "GK":(600,760),
-                "LB":(200,620),"LCB":(420,650),"RCB":(780,650),"RB":(1000,620),
-                "LDM":(470,520),"CDM":(600,520),"RDM":(730,520),
-                "LAM":(420,360),"CAM":(600,340),"RAM":(780,360),
-                "ST":(600,210)
-            },
-            "4-4-2": {
-                "GK":(600,760),
-                "LB":(200,620),"LCB":(420,650),"RCB":(780,650),"RB":(1000,620),
-                "LM":(320,430),"LCM":(500,430),"RCM":(700,430),"RM":(880,430),
-                "LS":(520,250),"RS":(680,250)
-            },
-        }
-        coords = COORDS.get(squad.formation, COORDS["4-3-3"])
         iframe_h = 620
 
         box_w, box_h = rect_w*0.5, 120
@@ -154,28 +193,6 @@ def _draw_pitch(squad: Squad, orientation: str = "vertical"):
         rect_x, rect_y, rect_w, rect_h, r = 20, 20, width-40, height-40, 16
         mid_line = {"x1": rect_x, "y1": height/2, "x2": width-20, "y2": height/2}
         center = (width/2, height/2)
-        COORDS_V = {
-            "4-3-3": {
-                "GK":(400,1120),
-                "LB":(150, 930), "LCB":(300, 970), "RCB":(500, 970), "RB":(650, 930),
-                "LCM":(300, 720), "CM":(400, 690), "RCM":(500, 720),
-                "LW":(190, 440), "ST":(400, 360), "RW":(610, 440),
-            },
-            "4-2-3-1": {
-                "GK":(400,1120),
-                "LB":(150, 930), "LCB":(300, 970), "RCB":(500, 970), "RB":(650, 930),
-                "LDM":(320, 790), "CDM":(400, 790), "RDM":(480, 790),
-                "LAM":(300, 560), "CAM":(400, 540), "RAM":(500, 560),
-                "ST":(400, 380),
-            },
-            "4-4-2": {
-                "GK":(400,1120),
-                "LB":(150, 930), "LCB":(300, 970), "RCB":(500, 970), "RB":(650, 930),
-                "LM":(240, 690), "LCM":(340, 690), "RCM":(460, 690), "RM":(560, 690),
-                "LS":(360, 420), "RS":(440, 420),
-            },
-        }
-        coords = COORDS_V.get(squad.formation, COORDS_V["4-3-3"])
         iframe_h = 720
 
         box_h, box_w = rect_h*0.22, rect_w
@@ -185,11 +202,8 @@ def _draw_pitch(squad: Squad, orientation: str = "vertical"):
         dn_box  = (rect_x, rect_y+rect_h-box_h, rect_w, box_h)
         dn_area = (rect_x + (rect_w-area_w)/2, rect_y+rect_h-area_h, area_w, area_h)
 
-    # HTML + SVG (aesthetics only)
-    html = f"""
-<!doctype html>
-<html><head><meta charset="utf-8"></head>
-<body style="margin:0">
+    # SVG (aesthetics only)
+    svg = f"""
 <svg viewBox="0 0 {width} {height}" width="100%" height="{iframe_h}"
      preserveAspectRatio="xMidYMid meet" xmlns="http://www.w3.org/2000/svg">
 
@@ -236,200 +250,292 @@ def _draw_pitch(squad: Squad, orientation: str = "vertical"):
   <path d="M {rect_x} {rect_y+rect_h-20} a20,20 0 0,0 20,20" stroke="#e8f5ee" stroke-width="3" fill="none" opacity=".9"/>
   <path d="M {rect_x+rect_w-20} {rect_y+rect_h} a20,20 0 0,0 20,-20" stroke="#e8f5ee" stroke-width="3" fill="none" opacity=".9"/>
 """
+    return svg, iframe_h
+
+def _compact(svg: str) -> str:
+    """One-line SVG: blank or indented lines would break st.markdown's HTML block."""
+    return " ".join(line.strip() for line in svg.splitlines() if line.strip())
+
+# Formatted once at import: only the player circles change between reruns
+_PITCH_PREFIX = {}
+for _o in ("vertical", "horizontal"):
+    _svg, _h = _pitch_prefix(_o)
+    _PITCH_PREFIX[_o] = (_compact(_svg), _h)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _pitch_png(svg: str, width: int, height: int) -> bytes:
+    """Rasterizes a full pitch SVG (players included) to PNG.
+
+    Only used when cairosvg imports (it needs the system cairo library);
+    otherwise _draw_pitch inlines the SVG instead.
+    """
+    return cairosvg.svg2png(bytestring=svg.encode("utf-8"), output_width=width, output_height=height)
+
+def _draw_pitch(squad: Squad, orientation: str = "vertical"):
+    if orientation not in _PITCH_PREFIX:
+        orientation = "vertical"
+    prefix, _ = _PITCH_PREFIX[orientation]
+    coords_by_formation = _COORDS_H if orientation == "horizontal" else _COORDS_V
+    coords = coords_by_formation.get(squad.formation, coords_by_formation["4-3-3"])
 
     # Players (white circle with green border and shadow)
+    markers = []
     for pos, (x, y) in coords.items():
         p = squad.slots.get(pos).player if pos in squad.slots else None
+        # Escaped: the SVG is inlined into the page DOM, not a sandboxed iframe
         label = (p.get("name","") or pos).split()[0] if p else pos
-        html += f'''
-  <g filter="url(#shadow)">
-    <circle cx="{x}" cy="{y}" r="32" fill="#ffffff" stroke="#0b5f35" stroke-width="4"/>
-    <text x="{x}" y="{y+6}" font-size="18" text-anchor="middle" font-weight="700" fill="#0b5f35">{label}</text>
-  </g>'''
+        markers.append(
+            f'<g filter="url(#shadow)">'
+            f'<circle cx="{x}" cy="{y}" r="32" fill="#ffffff" stroke="#0b5f35" stroke-width="4"/>'
+            f'<text x="{x}" y="{y+6}" font-size="18" text-anchor="middle" font-weight="700" fill="#0b5f35">{html.escape(label)}</text>'
+            f'</g>'
+        )
 
-    html += "\n</svg></body></html>"
-    st_html(html, height=iframe_h+20, scrolling=False)
+    svg = prefix + " " + "".join(markers) + "</svg>"
+    if cairosvg is not None:
+        # One cached PNG per distinct pitch instead of an SVG iframe per rerun
+        width, height = (1200, 800) if orientation == "horizontal" else (800, 1200)
+        st.image(_pitch_png(svg, width, height), use_container_width=True)
+        return
+    # Inline SVG in the page itself: no iframe/document to build on every rerun
+    st.markdown(svg, unsafe_allow_html=True)
+
+@lru_cache(maxsize=1)
+def _scan(dir_mtime: float) -> tuple[str, ...]:
+    """Valid squad names; rescanned only when the directory's mtime changes.
+
+    Squad.save writes a temp file and os.replace()s it, which bumps the directory
+    mtime, so new and overwritten squads both invalidate this cache.
+    """
+    out = []
+    for p in SQUADS_DIR.glob("*.json"):
+        try:
+            mtime = p.stat().st_mtime
+        except OSError:
+            continue
+        if _is_valid_squad_cached(str(p), mtime):
+            out.append(p.stem)
+    return tuple(out)
 
 def _list_saved_squads() -> list[str]:
-    all_names = [p.stem for p in SQUADS_DIR.glob("*.json")]
-    return [n for n in all_names if _is_valid_squad_file(n)]
+    try:
+        dir_mtime = SQUADS_DIR.stat().st_mtime
+    except OSError:
+        return []
+    return list(_scan(dir_mtime))
 
 def _load_squad(name: str) -> Squad:
     return Squad.load(str(SQUADS_DIR / f"{name}.json"))
 
+def _squad_mtime(name: str) -> float:
+    try:
+        return (SQUADS_DIR / f"{name}.json").stat().st_mtime
+    except OSError:
+        return 0.0
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _compare(a_name: str, a_mtime: float, b_name: str, b_mtime: float):
+    """Comparison table, recomputed only when either squad file changes."""
+    return compare_squads(_load_squad(a_name), _load_squad(b_name))
+
 def _save_squad(name: str, squad: Squad):
     (SQUADS_DIR / f"{name}.json").parent.mkdir(parents=True, exist_ok=True)
     squad.save(str(SQUADS_DIR / f"{name}.json"))
 
+@st.cache_resource(show_spinner=False)
+def _fbref_stats() -> FBrefStats:
+    """Shared FBref client (one per server process)."""
+    return FBrefStats()
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _load_player_names() -> list[str]:
+    """Sorted unique player names; cached so keystrokes don't reload FBref."""
+    df = _fbref_stats()._fb.read_player_season_stats(stat_type="standard").reset_index()
+    return sorted(df["player"].dropna().unique().tolist())
+
+@st.cache_data(ttl=900, show_spinner=False)
+def _pool(season: str, league: str):
+    """Player pool for the Optimization tab, shared by Optimize and Top-3."""
+    return load_player_pool(season=season or None, league=league or None)
+
 def _search_box() -> str | None:
-    fb = FBrefStats()
-    df = fb._fb.read_player_season_stats(stat_type="standard").reset_index()
-    names = sorted(df["player"].dropna().unique().tolist())
+    names = _load_player_names()
     q = st.text_input("Search player", "")
     if not q:
         return None
-    opts = [h for h,sc,_ in process.extract(q, names, limit=5, score_cutoff=70)]
+    opts = top_matches(q, names, limit=5, score_cutoff=70)
     return st.selectbox("Matches", opts or [q])
 
-def show() -> None:
-    _inject_css()
-    st.header("📝 XI Builder", divider="grey")
-    st.caption("Build your XI manually, optimize it with basic criteria, and compare it with other saved XIs.")
-
-    # Initial state
-    if "squad" not in st.session_state:
-        st.session_state["squad"] = Squad()
-        st.session_state["squad"].set_formation("4-3-3")
+# Player dict key -> pool column, used when filling slots from optimize_xi rows
+FIELD_MAP = {
+    "name": "name",
+    "team": "team",
+    "league": "league",
+    "season": "season",
+    "age": "age",
+    "position": "pos",
+    "market_value_mil": "market_value_mil",
+    "goals": "goals",
+    "assists": "assists",
+    "xG": "xG",
+    "minutes": "minutes",
+}
+
+# Each tab is a fragment: widget interactions inside one tab rerun only that tab,
+# so typing in the search box doesn't reload the pool or redraw other pitches.
+# Shared state (the current squad) lives in st.session_state.
+
+# ————— Manual builder —————
+@st.fragment
+def _builder_tab() -> None:
     squad: Squad = st.session_state["squad"]
-
-    tab1, tab2, tab3 = st.tabs(["Builder", "Optimization", "Comparison"])
-
-    # ————— Manual builder —————
-    with tab1:
-        c1,c2 = st.columns([1,1])
-        with c1:
-            formation = st.selectbox(
-                "Formation",
-                list(FORMATIONS.keys()),
-                index=list(FORMATIONS.keys()).index(squad.formation),
-                key="formation_builder",
-                help="Select the system and place players by position."
-            )
-            if formation != squad.formation:
-                squad.set_formation(formation)
-            _draw_pitch(squad)
-
-        with c2:
-            pos = st.selectbox("Position", FORMATIONS[squad.formation], key="pos_builder")
-            name = _search_box()
-            if name and st.button("Add to XI", use_container_width=True):
-                squad.add(pos, name)
-                _safe_rerun()
-
-            if st.button("Clear position", use_container_width=True):
-                squad.remove(pos)
-                _safe_rerun()
-
-            st.divider()
-            st.subheader("Current squad")
-            st.dataframe(squad.to_dataframe(), use_container_width=True)
-            st.metric("Total value", f"{squad.total_value():.1f} M€")
-
-            st.divider()
-            save_name = st.text_input("Save as", "", placeholder="e.g., my_favorite_xi")
-            if st.button("Save XI"):
-                if save_name.strip():
-                    _save_squad(save_name.strip(), squad)
-                    st.success(f"Saved as {save_name}.json")
-                else:
-                    st.warning("Provide a name to save your XI.")
-
-    # ————— Automatic optimization —————
-    with tab2:
-        st.subheader("Simple optimization")
-        st.caption("Choose season and formation and click Optimize. Adjust weights and budget in Advanced options.")
-        c1,c2,c3 = st.columns(3)
-        season = c1.text_input("Season", "2024-2025")
-        league = c2.text_input("League (optional)", "")
-        form_sel = c3.selectbox(
+    c1,c2 = st.columns([1,1])
+    with c1:
+        formation = st.selectbox(
             "Formation",
             list(FORMATIONS.keys()),
             index=list(FORMATIONS.keys()).index(squad.formation),
-            key="formation_opt"
+            key="formation_builder",
+            help="Select the system and place players by position."
         )
+        if formation != squad.formation:
+            squad.set_formation(formation)
+        _draw_pitch(squad)
+
+    with c2:
+        pos = st.selectbox("Position", FORMATIONS[squad.formation], key="pos_builder")
+        name = _search_box()
+        if name and st.button("Add to XI", use_container_width=True):
+            squad.add(pos, name)
+            _safe_rerun()
+
+        if st.button("Clear position", use_container_width=True):
+            squad.remove(pos)
+            _safe_rerun()
+
+        st.divider()
+        st.subheader("Current squad")
+        st.table(squad.to_dataframe())
+        st.metric("Total value", f"{squad.total_value():.1f} M€")
+
+        st.divider()
+        save_name = st.text_input("Save as", "", placeholder="e.g., my_favorite_xi")
+        if st.button("Save XI"):
+            if save_name.strip():
+                _save_squad(save_name.strip(), squad)
+                st.success(f"Saved as {save_name}.json")
+            else:
+                st.warning("Provide a name to save your XI.")
 
-        with st.expander("Advanced options (weights and budget)"):
-            w1,w2,w3,w4 = st.columns(4)
-            w_goals = w1.slider("Weight Goals", 0.0, 1.0, 0.5, 0.05)
-            w_ass   = w2.slider("Weight Assists", 0.0, 1.0, 0.2, 0.05)
-            w_xg    = w3.slider("Weight xG", 0.0, 1.0, 0.3, 0.05)
-            w_min   = w4.slider("Weight Minutes", 0.0, 1.0, 0.2, 0.05)
-            use_budget = st.checkbox("Use budget (requires market values)", value=False)
-            budget = st.number_input("Budget (M€)", 0.0, 9999.0, 0.0, 5.0) if use_budget else 0.0
-            custom_weights = {"goals":w_goals,"assists":w_ass,"xG":w_xg,"minutes":w_min} if any([w_goals,w_ass,w_xg,w_min]) else None
-
-        st.caption("Top by position are chosen with typical role metrics (forwards: goals/xG; midfielders: assists; defenders/goalkeeper: minutes).")
-
-        if st.button("Optimize XI", use_container_width=True):
-            pool = load_player_pool(season=season or None, league=league or None)
-            if custom_weights:
-                pool = score_players(pool, custom_weights)
+
+# ————— Automatic optimization —————
+@st.fragment
+def _opt_tab() -> None:
+    squad: Squad = st.session_state["squad"]
+    st.subheader("Simple optimization")
+    st.caption("Choose season and formation and click Optimize. Adjust weights and budget in Advanced options.")
+    c1,c2,c3 = st.columns(3)
+    season = c1.text_input("Season", "2024-2025")
+    league = c2.text_input("League (optional)", "")
+    form_sel = c3.selectbox(
+        "Formation",
+        list(FORMATIONS.keys()),
+        index=list(FORMATIONS.keys()).index(squad.formation),
+        key="formation_opt"
+    )
+
+    with st.expander("Advanced options (weights and budget)"):
+        w1,w2,w3,w4 = st.columns(4)
+        w_goals = w1.slider("Weight Goals", 0.0, 1.0, 0.5, 0.05)
+        w_ass   = w2.slider("Weight Assists", 0.0, 1.0, 0.2, 0.05)
+        w_xg    = w3.slider("Weight xG", 0.0, 1.0, 0.3, 0.05)
+        w_min   = w4.slider("Weight Minutes", 0.0, 1.0, 0.2, 0.05)
+        use_budget = st.checkbox("Use budget (requires market values)", value=False)
+        budget = st.number_input("Budget (M€)", 0.0, 9999.0, 0.0, 5.0) if use_budget else 0.0
+        custom_weights = {"goals":w_goals,"assists":w_ass,"xG":w_xg,"minutes":w_min} if any([w_goals,w_ass,w_xg,w_min]) else None
+
+    st.caption("Top by position are chosen with typical role metrics (forwards: goals/xG; midfielders: assists; defenders/goalkeeper: minutes).")
+
+    if st.button("Optimize XI", use_container_width=True):
+        pool = _pool(season, league)
+        try:
             chosen = optimize_xi(
                 form_sel, pool,
                 budget_mil=(budget if use_budget and budget>0 else None),
                 user_weights=(custom_weights if custom_weights else None)
             )
-            new_sq = Squad(formation=form_sel)
-            for pos, row in chosen:
-                new_sq.slots[pos].player = {
-                    "name": row.get("name"),
-                    "team": row.get("team"),
-                    "league": row.get("league"),
-                    "season": row.get("season"),
-                    "age": row.get("age"),
-                    "position": row.get("pos"),
-                    "market_value_mil": row.get("market_value_mil"),
-                    "goals": row.get("goals"),
-                    "assists": row.get("assists"),
-                    "xG": row.get("xG"),
-                    "minutes": row.get("minutes"),
-                }
-            st.session_state["squad"] = new_sq
-            st.success("Optimized XI generated.")
-            _safe_rerun()
+        except ValueError as e:  # e.g. budget too low for a full XI
+            st.error(str(e))
+            return
+        new_sq = Squad(formation=form_sel)
+        for pos, row in chosen:
+            rec = dict(row)
+            new_sq.slots[pos].player = {k: rec.get(v) for k, v in FIELD_MAP.items()}
+        st.session_state["squad"] = new_sq
+        st.success("Optimized XI generated.")
+        _safe_rerun()
+
+    st.subheader("Top-3 suggested per position")
+    try:
+        from services.xi_service import top_per_slot
+        top = top_per_slot(_pool(season, league), form_sel, k=3)
+        if not top.empty:
+            st.dataframe(top, use_container_width=True)
+    except Exception as e:
+        st.caption(f"Could not compute suggestions: {e}")
+
+
+# ————— Comparison —————
+@st.fragment
+def _cmp_tab() -> None:
+    st.subheader("Compare two saved XIs")
+    all_sq = _list_saved_squads()
+    if not all_sq:
+        st.info("No saved XIs yet. Save one in the Builder tab.")
+    else:
+        c1,c2 = st.columns(2)
+        with c1:
+            a_name = st.selectbox("Squad A", all_sq, key="cmp_a")
+            try:
+                A = _load_squad(a_name)
+            except Exception as e:
+                st.error(f"Error loading {a_name}.json: {e}")
+                st.stop()
+            st.caption(f"{a_name}.json")
+            _draw_pitch(A)
+            st.table(A.to_dataframe())
+        with c2:
+            b_name = st.selectbox("Squad B", all_sq, key="cmp_b")
+            try:
+                B = _load_squad(b_name)
+            except Exception as e:
+                st.error(f"Error loading {b_name}.json: {e}")
+                st.stop()
+            st.caption(f"{b_name}.json")
+            _draw_pitch(B)
+            st.table(B.to_dataframe())
+        st.divider()
+        st.subheader("Comparative summary")
+        st.dataframe(
+            _compare(a_name, _squad_mtime(a_name), b_name, _squad_mtime(b_name)),
+            use_container_width=True,
+        )
 
-        st.subheader("Top-3 suggested per position")
-        try:
-            from services.xi_service import score_for_slot, ELIGIBLE_MAP
-            pool = load_player_pool(season=season or None, league=league or None)
-            import pandas as pd
-            rows = []
-            for slot in FORMATIONS[form_sel]:
-                sc = score_for_slot(pool, slot).copy()
-                def eligible(row_pos):
-                    rp = str(row_pos).upper()
-                    return any(p in rp for p in ELIGIBLE_MAP.get(slot, [slot]))
-                sc = sc[sc["pos"].apply(eligible)]
-                sc = sc.sort_values("score_slot", ascending=False).head(3)
-                for _,r in sc.iterrows():
-                    rows.append({"Position":slot, "Name":r.get("name"), "Score":round(float(r.get("score_slot",0)),3), "Club":r.get("team")})
-            if rows:
-                import pandas as pd
-                st.dataframe(pd.DataFrame(rows), use_container_width=True)
-        except Exception as e:
-            st.caption(f"Could not compute suggestions: {e}")
-
-    # ————— Comparison —————
-    with tab3:
-        st.subheader("Compare two saved XIs")
-        all_sq = _list_saved_squads()
-        if not all_sq:
-            st.info("No saved XIs yet. Save one in the Builder tab.")
-        else:
-            c1,c2 = st.columns(2)
-            with c1:
-                a_name = st.selectbox("Squad A", all_sq, key="cmp_a")
-                try:
-                    A = _load_squad(a_name)
-                except Exception as e:
-                    st.error(f"Error loading {a_name}.json: {e}")
-                    st.stop()
-                st.caption(f"{a_name}.json")
-                _draw_pitch(A)
-                st.dataframe(A.to_dataframe(), use_container_width=True)
-            with c2:
-                b_name = st.selectbox("Squad B", all_sq, key="cmp_b")
-                try:
-                    B = _load_squad(b_name)
-                except Exception as e:
-                    st.error(f"Error loading {b_name}.json: {e}")
-                    st.stop()
-                st.caption(f"{b_name}.json")
-                _draw_pitch(B)
-                st.dataframe(B.to_dataframe(), use_container_width=True)
-            st.divider()
-            st.subheader("Comparative summary")
-            st.dataframe(compare_squads(A,B), use_container_width=True)
 
+def show() -> None:
+    _inject_css()
+    st.header("📝 XI Builder", divider="grey")
+    st.caption("Build your XI manually, optimize it with basic criteria, and compare it with other saved XIs.")
 
+    # Initial state
+    if "squad" not in st.session_state:
+        st.session_state["squad"] = Squad()
+        st.session_state["squad"].set_formation("4-3-3")
 
+    tab1, tab2, tab3 = st.tabs(["Builder", "Optimization", "Comparison"])
+    with tab1:
+        _builder_tab()
+    with tab2:
+        _opt_tab()
+    with tab3:
+        _cmp_tab()
@@ -1,25 +1,38 @@
+from functools import lru_cache
+
 from adaptors.transfermarkt import get_market_value
 from adaptors.soccerdata_fbref import FBrefStats
 from models.players import Player
 
-_fb = FBrefStats()  # instancia global; se cachea internamente
+@lru_cache(maxsize=1)
+def _get_fb() -> FBrefStats:
+    """Instancia global perezosa: se crea en la primera búsqueda, no al importar."""
+    return FBrefStats()
 
-def fetch_player(name: str) -> Player | None:
-    stats = _fb.get_player_stats(name)
+def fetch_player_stats(name: str) -> Player | None:
+    """Jugador con las estadísticas de FBref, sin valor de mercado (sin red a Transfermarkt)."""
+    stats = _get_fb().get_player_stats(name)
     if stats is None:
         return None
 
-    mv = get_market_value(name)  # puede ser None
     return Player(
         name=name,
         age=stats.get("age"),
         position=stats.get("position"),
         team=stats.get("team"),
         league=stats.get("league"),
-        market_value_mil=mv,
+        market_value_mil=None,
         season=stats.get("season"),
         goals=stats.get("goals"),
         assists=stats.get("assists"),
         xG=stats.get("xG"),
         minutes=stats.get("minutes"),
     )
+
+def fetch_player(name: str) -> Player | None:
+    player = fetch_player_stats(name)
+    if player is None:
+        return None
+
+    mv = get_market_value(name)  # puede ser None
+    return player.model_copy(update={"market_value_mil": mv})
@@ -1,7 +1,11 @@
 # services/shortlist_service.py — Shortlist & Notes (service) v1.0
 from __future__ import annotations
 import json
+import os
+import threading
 import uuid
+from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, List, Any, Optional
 from datetime import datetime
@@ -11,12 +15,38 @@ SHORTLISTS_DIR.mkdir(parents=True, exist_ok=True)
 
 SCHEMA_VERSION = 1
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+
+    def _json_dumps(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+except ImportError:
+    _json_loads = json.loads
+
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+
+def _write_json(p: Path, obj: Any) -> None:
+    """Escritura atómica: archivo temporal + os.replace (nunca queda a medias)."""
+    tmp = p.with_suffix(p.suffix + ".tmp")
+    tmp.write_bytes(_json_dumps(obj))
+    os.replace(tmp, p)
+
+def _now() -> str:
+    return datetime.utcnow().isoformat(timespec="seconds")
+
 def _file(name: str) -> Path:
     safe = "".join(c for c in name if c.isalnum() or c in ("_","-")).strip() or "default"
     return SHORTLISTS_DIR / f"{safe}.json"
 
+@lru_cache(maxsize=1)
+def _list_cached(dir_mtime_ns: int) -> tuple:
+    return tuple(sorted(p.stem for p in SHORTLISTS_DIR.glob("*.json")))
+
 def list_shortlists() -> List[str]:
-    return sorted([p.stem for p in SHORTLISTS_DIR.glob("*.json")]) or ["default"]
+    # Crear, borrar o reescribir (os.replace) un archivo cambia el mtime del directorio
+    return list(_list_cached(SHORTLISTS_DIR.stat().st_mtime_ns)) or ["default"]
 
 def create_shortlist_if_missing(name: str) -> None:
     p = _file(name)
@@ -24,27 +54,50 @@ def create_shortlist_if_missing(name: str) -> None:
         payload = {
             "name": name,
             "schema_version": SCHEMA_VERSION,
-            "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "created_at": _now(),
             "updated_at": None,
             "entries": []
         }
-        p.write_text(json.dumps(payload, indent=2, ensure_ascii=False))
+        _write_json(p, payload)
+
+def _facets(entries: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """Valores distintos para los filtros de la UI; se guardan en `data["_index"]`."""
+    return {
+        "positions": sorted({e.get("position") for e in entries if e.get("position")}),
+        "tags": sorted({t.strip() for e in entries for t in (e.get("tags") or "").split(",") if t.strip()}),
+        "leagues": sorted({e.get("league") for e in entries if e.get("league")}),
+    }
+
+@lru_cache(maxsize=32)
+def _read_cached(path: str, mtime_ns: int) -> bytes:
+    return Path(path).read_bytes()
 
 def load_shortlist(name: str) -> Dict[str, Any]:
+    """Shortlist parseada; el disco se relee solo si el archivo cambió (mtime).
+
+    Se cachean los bytes y se parsean en cada llamada: cada llamador recibe un
+    dict propio que puede modificar antes de guardarlo.
+    """
     p = _file(name)
     if not p.exists():
         create_shortlist_if_missing(name)
     try:
-        return json.loads(p.read_text(encoding="utf-8"))
+        data = _json_loads(_read_cached(str(p), p.stat().st_mtime_ns))
     except Exception:
         # fallback vacío
         return {"name": name, "schema_version": SCHEMA_VERSION, "entries": []}
+    if "_index" not in data:  # archivos antiguos: se calcula al cargar
+        data["_index"] = _facets(data.get("entries", []))
+    return data
 
 def save_shortlist(name: str, data: Dict[str, Any]) -> None:
-    data["updated_at"] = datetime.utcnow().isoformat(timespec="seconds")
-    _file(name).write_text(json.dumps(data, indent=2, ensure_ascii=False))
+    data["updated_at"] = _now()
+    data["_index"] = _facets(data.get("entries", []))
+    _write_json(_file(name), data)
 
 def delete_shortlist(name: str) -> None:
+    with _HANDLES_LOCK:
+        _HANDLES.pop(name, None)
     p = _file(name)
     if p.exists():
         p.unlink(missing_ok=True)
@@ -52,59 +105,161 @@ def delete_shortlist(name: str) -> None:
 # ——— Entradas ———
 BASE_FIELDS = ["id","name","position","team","league","age","value_mil","rating","status","tags","notes","updated_at"]
 
-def _sanitize_entry(e: Dict[str, Any]) -> Dict[str, Any]:
+def _sanitize_entry(e: Dict[str, Any], now: Optional[str] = None) -> Dict[str, Any]:
     out = {k: e.get(k) for k in BASE_FIELDS if k in e}
     out.setdefault("id", str(uuid.uuid4()))
     out.setdefault("rating", 3)
     out.setdefault("status", "Scouting")
     out.setdefault("tags", "")
-    out.setdefault("updated_at", datetime.utcnow().isoformat(timespec="seconds"))
+    if "updated_at" not in out:
+        out["updated_at"] = now or _now()
     return out
 
-def add_entry(shortlist: str, payload: Dict[str, Any]) -> Dict[str, Any]:
-    data = load_shortlist(shortlist)
-    entry = _sanitize_entry(payload)
+def _key(e: Dict[str, Any]) -> tuple:
+    """Clave de duplicado: (name, team, position) en minúsculas."""
+    return tuple((e.get(k) or "").lower() for k in ("name", "team", "position"))
+
+def _index(data: Dict[str, Any]) -> Dict[tuple, Dict[str, Any]]:
+    """Índice clave → entrada, para búsquedas O(1) en vez de recorrer la lista."""
+    idx: Dict[tuple, Dict[str, Any]] = {}
+    for e in data.get("entries", []):
+        idx.setdefault(_key(e), e)
+    return idx
+
+def add_entry(shortlist: str, payload: Dict[str, Any],
+              data: Optional[Dict[str, Any]] = None, defer_save: bool = False,
+              now: Optional[str] = None) -> Dict[str, Any]:
+    """Añade (o actualiza si ya existe) una entrada.
+
+    Para cargas masivas: pasar `data` ya cargado y `defer_save=True`, y llamar
+    a `save_shortlist` una sola vez al final; `now` reutiliza un mismo timestamp.
+    """
+    if data is None:
+        data = load_shortlist(shortlist)
+    now = now or _now()
+    entry = _sanitize_entry(payload, now)
     # Evitar duplicados exactos por (name, team, position)
-    if any(e.get("name","").lower()==entry["name"].lower() and
-           (e.get("team","") or "").lower()==(entry.get("team","") or "").lower() and
-           (e.get("position","") or "").lower()==(entry.get("position","") or "").lower()
-           for e in data.get("entries", [])):
+    existing = _index(data).get(_key(entry))
+    if existing is not None:
         # si existe, actualiza notas/estado/rating/etc. sin duplicar
-        for e in data["entries"]:
-            if (e.get("name","").lower()==entry["name"].lower() and
-                (e.get("team","") or "").lower()==(entry.get("team","") or "").lower() and
-                (e.get("position","") or "").lower()==(entry.get("position","") or "").lower()):
-                e.update({k:v for k,v in entry.items() if k!="id"})
-                e["updated_at"] = datetime.utcnow().isoformat(timespec="seconds")
+        existing.update({k:v for k,v in entry.items() if k!="id"})
+        existing["updated_at"] = now
+    else:
+        data.setdefault("entries", []).append(entry)
+    if not defer_save:
         save_shortlist(shortlist, data)
-        return entry
-    data.setdefault("entries", []).append(entry)
-    save_shortlist(shortlist, data)
     return entry
 
-def update_entry(shortlist: str, entry_id: str, payload: Dict[str, Any]) -> bool:
-    data = load_shortlist(shortlist)
+def update_entry(shortlist: str, entry_id: str, payload: Dict[str, Any],
+                 data: Optional[Dict[str, Any]] = None, defer_save: bool = False,
+                 now: Optional[str] = None) -> bool:
+    """Actualiza la entrada `entry_id`; mismos `data`/`defer_save`/`now` que `add_entry`."""
+    if data is None:
+        data = load_shortlist(shortlist)
     found = False
     for e in data.get("entries", []):
         if e.get("id") == entry_id:
             e.update({k:v for k,v in payload.items() if k in BASE_FIELDS and k!="id"})
-            e["updated_at"] = datetime.utcnow().isoformat(timespec="seconds")
+            e["updated_at"] = now or _now()
             found = True
             break
-    if found:
+    if found and not defer_save:
         save_shortlist(shortlist, data)
     return found
 
-def delete_entry(shortlist: str, entry_id: str) -> bool:
-    data = load_shortlist(shortlist)
+def delete_entry(shortlist: str, entry_id: str,
+                 data: Optional[Dict[str, Any]] = None, defer_save: bool = False) -> bool:
+    """Borra la entrada `entry_id`; mismos `data`/`defer_save` que `add_entry`."""
+    if data is None:
+        data = load_shortlist(shortlist)
     before = len(data.get("entries", []))
     data["entries"] = [e for e in data.get("entries", []) if e.get("id") != entry_id]
     after = len(data["entries"])
     if after < before:
-        save_shortlist(shortlist, data)
+        if not defer_save:
+            save_shortlist(shortlist, data)
         return True
     return False
 
+# ——— Handle en memoria ———
+@dataclass
+class ShortlistHandle:
+    """Shortlist cargada una vez; las ediciones se acumulan en memoria y
+    `flush()` escribe a disco solo si hubo cambios.
+
+    Como gestor de contexto toma el lock del handle: las ediciones del bloque y
+    su escritura son atómicas frente a otros hilos. Si el bloque lanza una
+    excepción, los cambios a medias se descartan recargando del disco.
+    """
+    name: str
+    data: Dict[str, Any]
+    mtime_ns: int = 0
+    dirty: bool = False
+    lock: threading.RLock = field(default_factory=threading.RLock, repr=False, compare=False)
+
+    def add(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        with self.lock:
+            entry = add_entry(self.name, payload, data=self.data, defer_save=True)
+            self.dirty = True
+            return entry
+
+    def update(self, entry_id: str, payload: Dict[str, Any]) -> bool:
+        with self.lock:
+            found = update_entry(self.name, entry_id, payload, data=self.data, defer_save=True)
+            self.dirty |= found
+            return found
+
+    def delete(self, entry_id: str) -> bool:
+        with self.lock:
+            found = delete_entry(self.name, entry_id, data=self.data, defer_save=True)
+            self.dirty |= found
+            return found
+
+    def flush(self) -> None:
+        with self.lock:
+            if self.dirty:
+                save_shortlist(self.name, self.data)
+                self.mtime_ns = _file(self.name).stat().st_mtime_ns
+                self.dirty = False
+
+    def reload(self) -> None:
+        """Descarta los cambios en memoria y vuelve a leer el archivo."""
+        with self.lock:
+            self.data = load_shortlist(self.name)
+            self.mtime_ns = _file(self.name).stat().st_mtime_ns
+            self.dirty = False
+
+    def __enter__(self) -> "ShortlistHandle":
+        self.lock.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc_type is None:
+                self.flush()
+            else:
+                self.reload()
+        finally:
+            self.lock.release()
+
+# Registro por defecto (uso fuera de la UI). La UI pasa uno propio por sesión
+# para que cada sesión de Streamlit edite su copia y no un dict compartido.
+_HANDLES: Dict[str, ShortlistHandle] = {}
+_HANDLES_LOCK = threading.Lock()
+
+def open_shortlist(name: str, registry: Optional[Dict[str, ShortlistHandle]] = None) -> ShortlistHandle:
+    """Handle por nombre dentro de `registry`. Si el archivo cambió fuera (mtime)
+    y no hay cambios pendientes, se recarga para no pisar ediciones externas."""
+    registry = _HANDLES if registry is None else registry
+    with _HANDLES_LOCK:
+        h = registry.get(name)
+        p = _file(name)
+        mtime = p.stat().st_mtime_ns if p.exists() else -1
+        if h is None or (not h.dirty and h.mtime_ns != mtime):
+            data = load_shortlist(name)  # crea el archivo si falta
+            h = registry[name] = ShortlistHandle(name, data, p.stat().st_mtime_ns)
+        return h
+
 # ——— CSV ———
 def export_shortlist_to_csv(shortlist: str) -> str:
     import pandas as pd
@@ -114,51 +269,68 @@ def export_shortlist_to_csv(shortlist: str) -> str:
     df.to_csv(fp, index=False)
     return fp
 
+# Columnas aceptadas en la importación, por orden de preferencia
+CSV_SYNONYMS = {
+    "id": ["id"],
+    "name": ["name","nombre"],
+    "position": ["position","pos"],
+    "team": ["team","equipo","club"],
+    "league": ["league","liga","comp"],
+    "age": ["age","edad"],
+    "value_mil": ["value_mil","market_value_mil","valor"],
+    "rating": ["rating","score"],
+    "status": ["status","estado"],
+    "tags": ["tags"],
+    "notes": ["notes","nota","observaciones"],
+    "updated_at": ["updated_at"],
+}
+CSV_CHUNKSIZE = 50_000
+
+def _normalize_csv_chunk(df):
+    """Renombra a columnas canónicas y limpia tipos de forma vectorizada."""
+    import numpy as np
+    import pandas as pd
+    df.columns = df.columns.astype(str).str.lower()
+    df = df.loc[:, ~df.columns.duplicated(keep="last")]
+    out = pd.DataFrame(index=df.index)
+    for canon, alts in CSV_SYNONYMS.items():
+        found = next((a for a in alts if a in df.columns), None)
+        out[canon] = df[found] if found else None
+    out = out.astype(object).where(out.notna(), None)
+
+    ids = out["id"].map(lambda v: str(v) if v not in (None, "") else None)
+    missing = ids.isna()
+    ids[missing] = [str(uuid.uuid4()) for _ in range(int(missing.sum()))]
+    out["id"] = ids
+
+    age = np.trunc(pd.to_numeric(out["age"], errors="coerce"))
+    out["age"] = age.astype("Int64").astype(object).where(age.notna(), None)
+    value = pd.to_numeric(out["value_mil"], errors="coerce")
+    out["value_mil"] = value.astype(object).where(value.notna(), None)
+    if any(a in df.columns for a in CSV_SYNONYMS["rating"]):
+        rating = np.trunc(pd.to_numeric(out["rating"], errors="coerce"))
+        out["rating"] = rating.fillna(3).clip(1, 5).astype(int)
+    return out
+
 def import_shortlist_from_csv(shortlist: str, file_like) -> None:
     import pandas as pd
     create_shortlist_if_missing(shortlist)
-    df = pd.read_csv(file_like)
-    # normalizar columnas
-    cols_map = {c.lower(): c for c in df.columns}
-    def pick(row, *names):
-        for n in names:
-            if n in cols_map:
-                return row[cols_map[n]]
-        return None
     data = load_shortlist(shortlist)
-    for _, row in df.iterrows():
-        payload = {
-            "id": str(pick(row, "id")) if pick(row, "id") else str(uuid.uuid4()),
-            "name": pick(row, "name","nombre"),
-            "position": pick(row, "position","pos"),
-            "team": pick(row, "team","equipo","club"),
-            "league": pick(row, "league","liga","comp"),
-            "age": pick(row, "age","edad"),
-            "value_mil": pick(row, "value_mil","market_value_mil","valor"),
-            "rating": pick(row, "rating","score"),
-            "status": pick(row, "status","estado"),
-            "tags": pick(row, "tags"),
-            "notes": pick(row, "notes","nota","observaciones"),
-            "updated_at": pick(row, "updated_at"),
-        }
-        # limpia tipos básicos
-        if payload["age"] not in (None, ""):
-            try: payload["age"] = int(payload["age"])
-            except: payload["age"] = None
-        if payload["value_mil"] not in (None, ""):
-            try: payload["value_mil"] = float(payload["value_mil"])
-            except: payload["value_mil"] = None
-        if payload["rating"] not in (None, ""):
-            try:
-                r = int(payload["rating"])
-                payload["rating"] = max(1, min(5, r))
-            except:
-                payload["rating"] = 3
-        payload = _sanitize_entry(payload)
-        # si existe id, actualiza; si no, añade
-        existing = next((e for e in data.get("entries", []) if e.get("id")==payload["id"]), None)
-        if existing:
-            existing.update({k:v for k,v in payload.items() if k!="id"})
-        else:
-            data.setdefault("entries", []).append(payload)
+    entries = data.setdefault("entries", [])
+    by_id: Dict[Any, Dict[str, Any]] = {}
+    for e in entries:
+        by_id.setdefault(e.get("id"), e)
+    now = _now()  # un único timestamp para toda la importación
+    # Lectura por bloques: archivos grandes no se cargan enteros en memoria
+    for chunk in pd.read_csv(file_like, chunksize=CSV_CHUNKSIZE):
+        for payload in _normalize_csv_chunk(chunk).to_dict("records"):
+            payload = _sanitize_entry(payload, now)
+            # si existe id, actualiza; si no, añade
+            existing = by_id.get(payload["id"])
+            if existing:
+                existing.update({k:v for k,v in payload.items() if k!="id"})
+            else:
+                entries.append(payload)
+                by_id[payload["id"]] = payload
+    # Una sola escritura al final de la importación
     save_shortlist(shortlist, data)
@@ -2,14 +2,37 @@
 # services/xi_service.py — XI logic (optimizer + persistence + comparer)
 from __future__ import annotations
 from dataclasses import dataclass, field
-from typing import Dict, Optional, List, Tuple
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, List, Tuple
 import json
 import math
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from functools import lru_cache
+from pathlib import Path
 import pandas as pd
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+
+    def _json_dumps(obj) -> bytes:
+        # OPT_SERIALIZE_NUMPY: las filas del pool traen escalares numpy
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+                            | orjson.OPT_SERIALIZE_NUMPY)
+except ImportError:
+    _json_loads = json.loads
+
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
 from adaptors.soccerdata_fbref import FBrefStats
-from adaptors.transfermarkt import get_market_value
+from adaptors.transfermarkt import fetch_market_value
 from services.player_service import fetch_player
+from utils.text import normalize
 
 FORMATIONS: Dict[str, List[str]] = {
     "4-3-3": ["GK","LB","LCB","RCB","RB","LCM","CM","RCM","LW","ST","RW"],
@@ -111,29 +134,31 @@ class Squad:
 
     @staticmethod
     def from_dict(d: dict) -> "Squad":
-        sq = Squad(formation=d.get("formation", "4-3-3"))
-        for pos in FORMATIONS[sq.formation]:
-            sq.slots[pos] = Slot(pos=pos, player=d.get("slots", {}).get(pos))
-        return sq
+        # Slots en un solo dict comp: __post_init__ no crea antes los vacíos
+        formation = d.get("formation", "4-3-3")
+        players = d.get("slots", {})
+        return Squad(formation=formation,
+                     slots={pos: Slot(pos=pos, player=players.get(pos)) for pos in FORMATIONS[formation]})
 
     def save(self, path: str) -> None:
         import os, tempfile
         d = os.path.dirname(path) or "."
         os.makedirs(d, exist_ok=True)
         tmp_path = path + ".tmp"
-        with open(tmp_path, "w", encoding="utf-8") as f:
-            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        with open(tmp_path, "wb") as f:
+            f.write(_json_dumps(self.to_dict()))
         os.replace(tmp_path, path)
 
     @staticmethod
     def load(path: str) -> "Squad":
         try:
-            with open(path, "r", encoding="utf-8") as f:
+            with open(path, "rb") as f:
                 raw = f.read()
             if not raw.strip():
                 # Archivo vacío: devolver Squad nuevo
                 return Squad()
-            data = json.loads(raw)
+            # orjson parsea bytes directamente (su JSONDecodeError hereda del de json)
+            data = _json_loads(raw)
             return Squad.from_dict(data)
         except json.JSONDecodeError as e:
             # Marcar archivo corrupto y devolver Squad nuevo
@@ -147,9 +172,55 @@ class Squad:
 # ——— Utilidades de datos ———
 
 
+# Caché en disco del pool normalizado, por temporada (evita re-scrapear y aplanar)
+_POOL_DIR = Path("data/cache")
+_POOL_TTL = 24*60*60  # segundos
+
+def _pool_cache_path(season: str) -> Path:
+    return _POOL_DIR / f"pool_{season}.parquet"
+
 def load_player_pool(season: Optional[str]=None, league: Optional[str]=None) -> pd.DataFrame:
     """Carga pool de jugadores desde FBref (standard stats). Robusto a columnas y MultiIndex."""
-    fb = FBrefStats(seasons=season or "2024-2025")
+    season = season or "2024-2025"
+    path = _pool_cache_path(season)
+    out = None
+    try:
+        if time.time() - path.stat().st_mtime < _POOL_TTL:
+            out = pd.read_parquet(path)
+    except Exception:
+        out = None  # sin caché o ilegible: recargamos
+    if out is None:
+        out = _fetch_pool(season)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".parquet.tmp")
+            out.to_parquet(tmp, compression="zstd", index=False)
+            os.replace(tmp, path)
+        except Exception:
+            pass  # la caché es opcional
+
+    if league:
+        out = out[out["league"].astype(str) == str(league)]
+
+    return out.dropna(subset=["name"]).copy()
+
+# Columna destino → candidatas en minúsculas, por orden de preferencia
+_POOL_COLS = {
+    "name":    ["player","name","player_player"],
+    "pos":     ["pos","position","player positions","player_pos"],
+    "team":    ["team","squad","player_team"],
+    "league":  ["league","comp","competition"],
+    "season":  ["season"],
+    "age":     ["age"],
+    "minutes": ["playing time_min","min","minutes","playing_time_min"],
+    "goals":   ["performance_gls","goals","gls"],
+    "assists": ["performance_ast","assists","ast"],
+    "xG":      ["expected_xg","xg","exp_xg"],
+}
+
+def _fetch_pool(season: str) -> pd.DataFrame:
+    """Descarga y normaliza el pool de una temporada (sin filtrar por liga)."""
+    fb = FBrefStats(seasons=season)
     df = fb._fb.read_player_season_stats(stat_type="standard").reset_index()
 
     # Aplanar MultiIndex si existe
@@ -157,63 +228,80 @@ def load_player_pool(season: Optional[str]=None, league: Optional[str]=None) ->
         df.columns = ["_".join([str(x) for x in tup if x not in (None, "", "Unnamed: 0_level_0")]).strip("_")
                       for tup in df.columns]
 
-    # Helper para elegir la primera columna disponible
-    def pick(colnames):
-        for c in colnames:
-            if c in df.columns:
-                return c
-        return None
+    # Índice nombre-en-minúsculas → columna real, construido una vez
+    lut: Dict[str, str] = {}
+    for c in df.columns:
+        lut.setdefault(str(c).lower(), c)
 
-    # Mapeo flexible
-    name_col = pick(["player","Player","name","Name","player_player"])
-    pos_col  = pick(["pos","Pos","position","Position","Player positions","player_pos"])
-    team_col = pick(["team","Team","squad","Squad","player_team"])
-    lg_col   = pick(["league","League","comp","Comp","competition","Competition"])
-    season_col = pick(["season","Season"])
-    age_col  = pick(["age","Age"])
-    min_col  = pick(["Playing Time_Min","min","minutes","Playing_Time_Min"])
-    gls_col  = pick(["Performance_Gls","goals","Gls"])
-    ast_col  = pick(["Performance_Ast","assists","Ast"])
-    xg_col   = pick(["Expected_xG","xG","Exp_xG"])
-
-    # Asegurar columnas destino
+    # Mapeo flexible: primera candidata disponible (sin distinguir mayúsculas)
     out = pd.DataFrame({
-        "name":    df[name_col] if name_col else None,
-        "pos":     df[pos_col] if pos_col else None,
-        "team":    df[team_col] if team_col else None,
-        "league":  df[lg_col] if lg_col else None,
-        "season":  df[season_col] if season_col else None,
-        "age":     df[age_col] if age_col else None,
-        "minutes": df[min_col] if min_col else None,
-        "goals":   df[gls_col] if gls_col else None,
-        "assists": df[ast_col] if ast_col else None,
-        "xG":      df[xg_col] if xg_col else None,
+        dest: next((df[lut[c]] for c in cands if c in lut), None)
+        for dest, cands in _POOL_COLS.items()
     })
 
     # Normalizaciones básicas
     out["pos"] = out["pos"].astype(str).str.upper().str.strip()
     out["season"] = out["season"].astype(str).str.strip()
 
-    if league:
-        out = out[out["league"].astype(str) == str(league)]
-
     # Evitar KeyError garantizando existencia de columnas
     for c in ["name","pos"]:
         if c not in out.columns:
             out[c] = None
 
-    return out.dropna(subset=["name"]).copy()
+    return out
+
+
+# Caché persistente de valores de mercado (sobrevive a reinicios)
+_MV_DB = Path("data/cache/mv.db")
+_MV_TTL = 24*60*60  # segundos
+_MV_WORKERS = 12
+
+def _mv_conn() -> sqlite3.Connection:
+    _MV_DB.parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(_MV_DB, timeout=10)
+    con.execute("CREATE TABLE IF NOT EXISTS mv_cache (name TEXT PRIMARY KEY, value REAL, fetched_at REAL)")
+    return con
+
+@lru_cache(maxsize=2048)
+def _cached_mv(name: str) -> Optional[float]:
+    """Valor de mercado: memoria → SQLite (con TTL) → scraping de Transfermarkt.
+
+    `fetch_market_value` distingue «no encontrado» (`None`, se guarda) de un
+    fallo de red (`MarketValueUnavailable`, se propaga): ni `lru_cache` ni
+    SQLite guardan los fallos.
+    """
+    key = normalize(name)
+    try:
+        with closing(_mv_conn()) as con:
+            hit = con.execute("SELECT value, fetched_at FROM mv_cache WHERE name = ?", (key,)).fetchone()
+    except sqlite3.Error:
+        hit = None
+    if hit is not None and time.time() - hit[1] < _MV_TTL:
+        return hit[0]
+
+    mv = fetch_market_value(name)
+    try:
+        with closing(_mv_conn()) as con, con:
+            con.execute("INSERT OR REPLACE INTO mv_cache VALUES (?, ?, ?)", (key, mv, time.time()))
+    except sqlite3.Error:
+        pass
+    return mv
+
+def _mv_or_none(name: str) -> Optional[float]:
+    try:
+        return _cached_mv(name)
+    except Exception:
+        return None
+
 def add_market_values(df: pd.DataFrame, max_lookup:int=60) -> pd.DataFrame:
     """Añade valor de mercado (M€) a un subconjunto de jugadores para no quemar el scraping."""
     df = df.copy()
-    df["market_value_mil"] = None
     names = df["name"].dropna().unique().tolist()[:max_lookup]
-    for n in names:
-        try:
-            mv = get_market_value(n)
-        except Exception:
-            mv = None
-        df.loc[df["name"]==n, "market_value_mil"] = mv
+    # Consultas de red en paralelo; luego una sola asignación vectorizada
+    with ThreadPoolExecutor(max_workers=_MV_WORKERS) as ex:
+        results = dict(zip(names, ex.map(_mv_or_none, names)))
+    mv = df["name"].map(results)
+    df["market_value_mil"] = mv.astype(object).where(mv.notna(), None)
     return df
 
 def zscore(s: pd.Series) -> pd.Series:
@@ -236,18 +324,22 @@ def score_players(df: pd.DataFrame, weights: Dict[str,float]) -> pd.DataFrame:
     )
     return out
 
-def slot_weights(slot: str) -> Dict[str,float]:
-    slot = str(slot).upper()
-    # Presets simples por línea. Ajustables.
-    if slot in ("ST","LS","RS","CF","LW","RW","LAM","RAM"):
-        return {"goals":0.5,"xG":0.3,"assists":0.2,"minutes":0.0}
-    if slot in ("CAM","CM","LCM","RCM","CDM","LDM","RDM","LM","RM"):
-        return {"assists":0.4,"minutes":0.3,"xG":0.2,"goals":0.1}
-    if slot in ("LB","RB","LCB","RCB"):
-        return {"minutes":0.6,"assists":0.2,"xG":0.1,"goals":0.1}
-    if slot == "GK":
-        return {"minutes":1.0,"goals":0.0,"assists":0.0,"xG":0.0}
-    return {"minutes":0.4,"goals":0.2,"assists":0.2,"xG":0.2}
+# Presets simples por línea. Ajustables. De solo lectura: se comparten entre llamadas.
+_W_ATT = MappingProxyType({"goals":0.5,"xG":0.3,"assists":0.2,"minutes":0.0})
+_W_MID = MappingProxyType({"assists":0.4,"minutes":0.3,"xG":0.2,"goals":0.1})
+_W_DEF = MappingProxyType({"minutes":0.6,"assists":0.2,"xG":0.1,"goals":0.1})
+_W_GK = MappingProxyType({"minutes":1.0,"goals":0.0,"assists":0.0,"xG":0.0})
+_W_DEFAULT = MappingProxyType({"minutes":0.4,"goals":0.2,"assists":0.2,"xG":0.2})
+
+SLOT_WEIGHTS_MAP: Dict[str, Mapping[str, float]] = {
+    **dict.fromkeys(("ST","LS","RS","CF","LW","RW","LAM","RAM"), _W_ATT),
+    **dict.fromkeys(("CAM","CM","LCM","RCM","CDM","LDM","RDM","LM","RM"), _W_MID),
+    **dict.fromkeys(("LB","RB","LCB","RCB"), _W_DEF),
+    "GK": _W_GK,
+}
+
+def slot_weights(slot: str) -> Mapping[str,float]:
+    return SLOT_WEIGHTS_MAP.get(str(slot).upper(), _W_DEFAULT)
 
 def score_for_slot(pool: pd.DataFrame, slot: str) -> pd.DataFrame:
     w = slot_weights(slot)
@@ -256,66 +348,110 @@ def score_for_slot(pool: pd.DataFrame, slot: str) -> pd.DataFrame:
     out["score_slot"] = out["score"]
     return out
 
+def _slot_matrices(pool: pd.DataFrame, slots: List[str],
+                   weights: Optional[Mapping[str, float]] = None):
+    """Puntuación y elegibilidad de todos los jugadores para todos los slots.
+
+    Devuelve `(scores, elig)`, ambas N×M (jugadores × slots): los z-scores se
+    calculan una vez y las puntuaciones salen de un único producto matricial,
+    equivalente a `score_for_slot` slot a slot. Con `weights`, esos pesos
+    sustituyen a los presets de `slot_weights` en todos los slots.
+    """
+    import re
+    import numpy as np
+
+    metrics = ["minutes","goals","assists","xG"]
+    z = np.column_stack([zscore(pool[m]).fillna(0).to_numpy(dtype=float) for m in metrics])
+    w = np.array([[(weights if weights is not None else slot_weights(s)).get(m, 0.0) for s in slots]
+                  for m in metrics])
+    scores = z @ w
+    pos_upper = pool["pos"].astype(str).str.upper()
+    elig = np.zeros((len(pool), len(slots)), dtype=bool)
+    for j, slot in enumerate(slots):
+        pattern = "|".join(re.escape(p) for p in ELIGIBLE_MAP.get(slot, [slot]))
+        elig[:, j] = pos_upper.str.contains(pattern, regex=True, na=False).to_numpy()
+    return scores, elig
+
+def top_per_slot(pool: pd.DataFrame, formation: str, k: int = 3) -> pd.DataFrame:
+    """Top-k jugadores elegibles por posición de la formación."""
+    import numpy as np
+
+    slots = FORMATIONS[formation]
+    scores, elig = _slot_matrices(pool, slots)
+    names = pool["name"].to_numpy()
+    teams = pool["team"].to_numpy()
+
+    rows = []
+    for j, slot in enumerate(slots):
+        cand = np.flatnonzero(elig[:, j])
+        for i in cand[np.argsort(-scores[cand, j], kind="stable")[:k]]:
+            rows.append({"Position":slot, "Name":names[i], "Score":round(float(scores[i, j]),3), "Club":teams[i]})
+    return pd.DataFrame(rows, columns=["Position","Name","Score","Club"])
+
 # ——— Optimización ———
-def optimize_xi(formation: str, pool: pd.DataFrame, budget_mil: Optional[float]=None) -> List[Tuple[str, dict]]:
+def optimize_xi(formation: str, pool: pd.DataFrame, budget_mil: Optional[float]=None,
+                user_weights: Optional[Dict[str,float]]=None) -> List[Tuple[str, dict]]:
     """
     Devuelve lista [(slot_pos, player_dict), ...] de 11 jugadores.
     Usa ILP con PuLP si hay presupuesto; si no, usa Hungarian máximo por score.
+    `user_weights` (goals/assists/xG/minutes) sustituye a los presets por slot.
     """
     slots = FORMATIONS[formation]
     pool = pool.copy().reset_index(drop=True)
 
-    # Elegibilidad booleana
-    def eligible(slot: str, row_pos: str) -> bool:
-        poss = ELIGIBLE_MAP.get(slot, [slot])
-        rp = str(row_pos).upper()
-        return any(p in rp for p in poss)
+    import numpy as np
+
+    scores, elig = _slot_matrices(pool, slots, user_weights)
 
-    # Si hay presupuesto, intentamos PuLP
+    # Si hay presupuesto, intentamos PuLP (sin PuLP o sin solver, caemos a hungarian)
     if budget_mil is not None:
         try:
             import pulp
+        except ImportError:
+            pulp = None
+        if pulp is not None:
             prob = pulp.LpProblem("xi_opt", pulp.LpMaximize)
-            # variables
-            x = {}
-            for i, row in pool.iterrows():
-                for j, slot in enumerate(slots):
-                    if eligible(slot, row["pos"]):
-                        x[(i,j)] = pulp.LpVariable(f"x_{i}_{j}", lowBound=0, upBound=1, cat="Binary")
-            # objetivo
-            prob += pulp.lpSum(pool.loc[i,"score"] * x[(i,j)] for (i,j) in x)
+            # variables solo para pares (jugador, slot) elegibles
+            pairs = [(i, j) for j in range(len(slots)) for i in np.flatnonzero(elig[:, j])]
+            x = {(i,j): pulp.LpVariable(f"x_{i}_{j}", lowBound=0, upBound=1, cat="Binary") for (i,j) in pairs}
+            by_slot: Dict[int, list] = {}
+            by_player: Dict[int, list] = {}
+            for (i,j), v in x.items():
+                by_slot.setdefault(j, []).append(v)
+                by_player.setdefault(i, []).append(v)
+            # objetivo: la misma puntuación por slot que usa el hungarian
+            prob += pulp.lpDot([scores[i, j] for (i,j) in pairs], list(x.values()))
             # cada slot exactamente 1
-            for j, slot in enumerate(slots):
-                prob += pulp.lpSum(x[(i,jj)] for (i,jj) in x if jj==j) == 1
+            for j in range(len(slots)):
+                prob += pulp.lpSum(by_slot.get(j, [])) == 1
             # cada jugador a lo sumo 1 slot
-            for i in pool.index:
-                prob += pulp.lpSum(x[(ii,j)] for (ii,j) in x if ii==i) <= 1
+            for vs in by_player.values():
+                prob += pulp.lpSum(vs) <= 1
             # presupuesto si hay valores
             if "market_value_mil" in pool.columns and pool["market_value_mil"].notna().any():
-                prob += pulp.lpSum(pool.loc[i,"market_value_mil"] * pulp.lpSum(x[(i,j)] for (i,j) in x if i==i) 
-                                   for i in pool.index) <= float(budget_mil)
-            prob.solve(pulp.PULP_CBC_CMD(msg=False))
-            sel = []
-            for (i,j), var in x.items():
-                if var.value() == 1:
-                    r = pool.iloc[i].to_dict()
-                    sel.append((slots[j], r))
-            return sel
-        except Exception:
-            pass  # caemos a hungarian
+                mv = pd.to_numeric(pool["market_value_mil"], errors="coerce").fillna(0).to_numpy(dtype=float)
+                prob += pulp.lpDot([mv[i] for (i,_) in pairs], list(x.values())) <= float(budget_mil)
+            try:
+                prob.solve(pulp.PULP_CBC_CMD(msg=False))
+            except pulp.PulpSolverError:
+                prob = None  # CBC no disponible
+            if prob is not None:
+                status = pulp.LpStatus[prob.status]
+                if status != "Optimal":
+                    # presupuesto insuficiente o slots sin elegibles: no devolver un XI parcial
+                    raise ValueError(f"No hay un XI completo de {formation} que cumpla posiciones "
+                                     f"y presupuesto de {budget_mil} M€ (PuLP: {status}).")
+                sel = []
+                for (i,j), var in x.items():
+                    if (var.value() or 0) > 0.5:
+                        r = pool.iloc[i].to_dict()
+                        sel.append((slots[j], r))
+                return sel
 
     # Hungarian sin presupuesto: asignamos -score como coste y bloqueamos no elegibles con gran coste
-    import numpy as np
     from scipy.optimize import linear_sum_assignment
 
-    n = len(pool)
-    m = len(slots)
-    cost = np.full((n, m), 1e6, dtype=float)
-    for j, slot in enumerate(slots):
-        slot_scored = score_for_slot(pool, slot)
-        for i, row in slot_scored.iterrows():
-            if eligible(slot, row["pos"]):
-                cost[i, j] = -float(row.get("score_slot", row.get("score", 0.0)))
+    cost = np.where(elig, -scores, 1e6)
     row_ind, col_ind = linear_sum_assignment(cost)
     chosen = []
     used_slots = set()
@@ -331,15 +467,17 @@ def optimize_xi(formation: str, pool: pd.DataFrame, budget_mil: Optional[float]=
 def compare_squads(a: Squad, b: Squad) -> pd.DataFrame:
     da = a.to_dataframe()
     db = b.to_dataframe()
-    # agregados
+    # agregados: coerción numérica una sola vez por squad (sum/mean ya ignoran NaN)
     def agg(df):
+        num = df[["Valor M€","Edad","Min","Goles","Asist","xG"]].apply(pd.to_numeric, errors="coerce")
+        sums = num.sum()
         return pd.Series({
-            "Valor total (M€)": pd.to_numeric(df["Valor M€"], errors="coerce").fillna(0).sum(),
-            "Edad media": pd.to_numeric(df["Edad"], errors="coerce").mean(),
-            "Min totales": pd.to_numeric(df["Min"], errors="coerce").fillna(0).sum(),
-            "Goles totales": pd.to_numeric(df["Goles"], errors="coerce").fillna(0).sum(),
-            "Asist totales": pd.to_numeric(df["Asist"], errors="coerce").fillna(0).sum(),
-            "xG total": pd.to_numeric(df["xG"], errors="coerce").fillna(0).sum(),
+            "Valor total (M€)": sums["Valor M€"],
+            "Edad media": num["Edad"].mean(),
+            "Min totales": sums["Min"],
+            "Goles totales": sums["Goles"],
+            "Asist totales": sums["Asist"],
+            "xG total": sums["xG"],
         })
     A = agg(da); B = agg(db)
     out = pd.DataFrame({"Squad A": A, "Squad B": B})
@@ -0,0 +1,28 @@
+# utils/fuzzy.py
+from __future__ import annotations
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+
+def top_matches(query: str, names, limit: int = 5, score_cutoff: float = 70) -> list[str]:
+    """Top-`limit` nombres por similitud (WRatio), igual que `process.extract`.
+
+    Calcula todas las puntuaciones de una vez con `process.cdist` (C, multihilo)
+    y selecciona los mejores con `np.argpartition` en lugar de ordenar todo.
+    """
+    if not query or len(names) == 0:
+        return []
+    scores = process.cdist([query], names, scorer=fuzz.WRatio,
+                           score_cutoff=score_cutoff, workers=-1)[0]
+    k = min(limit, len(scores))
+    # argpartition no es estable: en la frontera de empates nos quedamos con
+    # los de menor posición, como `process.extract`
+    thr = scores[np.argpartition(-scores, k - 1)[:k]].min()
+    better = np.flatnonzero(scores > thr)
+    ties = np.flatnonzero(scores == thr)[:k - len(better)]
+    idx = np.concatenate((better, ties))
+    idx = idx[scores[idx] >= score_cutoff]
+    # Mismo orden que `process.extract`: puntuación desc., luego posición
+    idx = idx[np.lexsort((idx, -scores[idx]))]
+    return [names[i] for i in idx]
@@ -0,0 +1,33 @@
+# utils/http.py
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:  # opcional: caché HTTP persistente en SQLite
+    from requests_cache import CachedSession
+except ImportError:
+    CachedSession = None
+
+
+def make_session(headers: dict, cache_path: str | None = None,
+                 expire_after: int | None = None) -> requests.Session:
+    """Sesión HTTP con keep-alive, pool de conexiones y reintentos con backoff.
+
+    No se fija `Accept-Encoding`: requests ya anuncia `gzip, deflate` y añade
+    `br` cuando el paquete `brotli` está instalado (y descomprime solo).
+    Forzarlo a mano sin `brotli` devolvería cuerpos ilegibles.
+
+    Con `cache_path` (y `requests-cache` instalado) las respuestas GET se
+    guardan en SQLite durante `expire_after` segundos y sobreviven a reinicios.
+    """
+    if cache_path and CachedSession is not None:
+        session = CachedSession(cache_path, expire_after=expire_after,
+                                allowable_methods=("GET",))
+    else:
+        session = requests.Session()
+    session.headers.update(headers)
+    retry = Retry(total=2, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
@@ -1,9 +1,12 @@
 # utils/text.py
 import re, unicodedata
 
+_WS = re.compile(r"\s+")
+
 def normalize(text: str) -> str:
     """Quita tildes, múltiplos espacios y pasa a minúsculas ASCII."""
-    text = unicodedata.normalize("NFKD", text)
-    text = text.encode("ascii", "ignore").decode("ascii")  # á -> a, ñ -> n
-    text = re.sub(r"\s+", " ", text)                      # colapsa espacios
+    if not text.isascii():  # en ASCII la descomposición NFKD no cambia nada
+        text = unicodedata.normalize("NFKD", text)
+        text = text.encode("ascii", "ignore").decode("ascii")  # á -> a, ñ -> n
+    text = _WS.sub(" ", text)                                  # colapsa espacios
     return text.strip().lower()